@@ -0,0 +1,191 @@
+"""
+Bandwidth and end-to-end latency of compressed list responses on a slow link.
+
+Serves a 100-product list (the GET /products payload) through
+CompressionMiddleware with uvicorn, and puts a throttling TCP proxy in
+front of it that limits bandwidth and adds round-trip delay in both
+directions. The client requests the list once per encoding the server can
+produce (identity, gzip, br, zstd) and reports bytes on the wire and
+latency including client-side decompression.
+
+Usage (from the repository root, with the inventory requirements and httpx installed):
+
+    python scripts/bench/compression_throttled.py --bandwidth-mbit 10 --rtt-ms 40 --requests 50
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "services", "inventory"))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from bson import ObjectId  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from app.compression import CompressionMiddleware, available_encodings  # noqa: E402
+from app.models import PRODUCT_LIST_ADAPTER  # noqa: E402
+from app.serialization import serialize  # noqa: E402
+
+
+def build_app(items: int, minimum_size: int):
+    now = datetime.utcnow()
+    docs = [
+        {
+            "_id": ObjectId(),
+            "name": f"Product {i}",
+            "description": f"Synthetic product {i} with a realistic length description for the catalog",
+            "price": 19.99 + i,
+            "category": ["books", "electronics", "garden", "kitchen", "toys"][i % 5],
+            "stock": 100 + i,
+            "image_url": f"https://cdn.example.com/products/{i}.jpg",
+            "created_at": now,
+            "updated_at": now,
+            "is_active": True,
+            "reserved_stock": i % 7,
+        }
+        for i in range(items)
+    ]
+    app = FastAPI()
+
+    @app.get("/products")
+    async def list_products():
+        return serialize(PRODUCT_LIST_ADAPTER, docs)
+
+    return CompressionMiddleware(app, minimum_size=minimum_size)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def throttled_pipe(reader, writer, bytes_per_second: float, one_way_delay: float):
+    """Deliver each chunk one-way-delay after it was read, at the link's bandwidth."""
+    link_free_at = 0.0
+    queue = asyncio.Queue()
+
+    async def deliver():
+        nonlocal link_free_at
+        while True:
+            arrived, chunk = await queue.get()
+            if chunk is None:
+                writer.close()
+                return
+            loop_time = asyncio.get_running_loop().time()
+            start = max(arrived + one_way_delay, link_free_at, loop_time)
+            link_free_at = start + len(chunk) / bytes_per_second
+            await asyncio.sleep(link_free_at - loop_time)
+            writer.write(chunk)
+            await writer.drain()
+
+    delivery = asyncio.ensure_future(deliver())
+    try:
+        while True:
+            chunk = await reader.read(16384)
+            queue.put_nowait((asyncio.get_running_loop().time(), chunk or None))
+            if not chunk:
+                break
+    finally:
+        await delivery
+
+
+async def start_proxy(upstream_port: int, bandwidth_mbit: float, rtt_ms: float):
+    bytes_per_second = bandwidth_mbit * 1_000_000 / 8
+    one_way = rtt_ms / 2000
+
+    async def handle(client_reader, client_writer):
+        upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", upstream_port)
+        try:
+            await asyncio.gather(
+                throttled_pipe(client_reader, upstream_writer, bytes_per_second, one_way),
+                throttled_pipe(upstream_reader, client_writer, bytes_per_second, one_way),
+                return_exceptions=True,
+            )
+        except asyncio.CancelledError:
+            pass  # connections still open when the benchmark exits
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def decoder(encoding: str):
+    if encoding == "gzip":
+        return lambda data: zlib.decompress(data, 31)
+    if encoding == "br":
+        import brotli
+        return brotli.decompress
+    if encoding == "zstd":
+        import zstandard
+        return lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return lambda data: data
+
+
+async def measure(url: str, encoding: str, requests: int):
+    decode = decoder(encoding)
+    latencies, wire_bytes, body_bytes = [], 0, 0
+    # A fresh connection per encoding; requests reuse it like the BFF does
+    async with httpx.AsyncClient(headers={"Accept-Encoding": encoding}) as client:
+        for i in range(requests + 1):
+            start = time.perf_counter()
+            async with client.stream("GET", url) as response:
+                raw = b"".join([chunk async for chunk in response.aiter_raw()])
+            body = decode(raw)
+            elapsed = time.perf_counter() - start
+            if i == 0:
+                continue  # connection setup
+            latencies.append(elapsed)
+            wire_bytes += len(raw)
+            body_bytes += len(body)
+    return latencies, wire_bytes / requests, body_bytes / requests
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--bandwidth-mbit", type=float, default=10.0)
+    parser.add_argument("--rtt-ms", type=float, default=40.0)
+    parser.add_argument("--minimum-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = start_server(build_app(args.items, args.minimum_size), port)
+    proxy = await start_proxy(port, args.bandwidth_mbit, args.rtt_ms)
+    url = f"http://127.0.0.1:{proxy.sockets[0].getsockname()[1]}/products"
+
+    print(
+        f"{args.items} products, {args.bandwidth_mbit} Mbit/s, {args.rtt_ms} ms RTT, "
+        f"{args.requests} requests per encoding"
+    )
+    print(f"{'encoding':<10}{'wire bytes':>12}{'ratio':>8}{'mean ms':>10}{'p95 ms':>10}")
+    for encoding in ["identity"] + list(available_encodings()):
+        latencies, wire, body = await measure(url, encoding, args.requests)
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        print(
+            f"{encoding:<10}{wire:>12.0f}{body / wire:>8.1f}"
+            f"{statistics.mean(latencies) * 1000:>10.1f}{p95 * 1000:>10.1f}"
+        )
+
+    proxy.close()
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
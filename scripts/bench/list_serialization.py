@@ -0,0 +1,143 @@
+"""
+CPU per 100-item list response through FastAPI, by serialization path.
+
+  manual+json      handler builds Product models field by field (the old
+                   routes); FastAPI dumps, re-validates and json.dumps them
+  documents+json   handler returns Mongo documents; FastAPI validates them
+                   against response_model and encodes with JSONResponse
+  documents+orjson same, with ORJSONResponse as the default response class
+  pre-serialized   handler returns serialize(PRODUCT_LIST_ADAPTER, docs):
+                   one pydantic-core validate + dump_json, no FastAPI encoder
+
+Calls the ASGI app directly (no server or network) and reports process CPU
+time per response.
+
+Usage (from the repository root, with the inventory requirements installed):
+
+    python scripts/bench/list_serialization.py --items 100 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "services", "inventory"))
+
+from bson import ObjectId  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+
+from app.models import Product, PRODUCT_LIST_ADAPTER  # noqa: E402
+from app.serialization import serialize  # noqa: E402
+
+
+def documents(count: int) -> List[dict]:
+    now = datetime.utcnow()
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"Product {i}",
+            "description": "A synthetic product used to measure serialization",
+            "price": 19.99 + i,
+            "category": "benchmarks",
+            "stock": 100,
+            "image_url": None,
+            "created_at": now,
+            "updated_at": now,
+            "is_active": True,
+            "reserved_stock": 0,
+        }
+        for i in range(count)
+    ]
+
+
+def build_app(docs) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/manual+json", response_model=List[Product], response_class=JSONResponse)
+    async def manual():
+        return [
+            Product(
+                id=str(p["_id"]),
+                name=p["name"],
+                description=p.get("description"),
+                price=p["price"],
+                category=p["category"],
+                stock=p["stock"],
+                image_url=p.get("image_url"),
+                created_at=p["created_at"],
+                is_active=p["is_active"],
+                reserved_stock=p.get("reserved_stock", 0),
+            )
+            for p in docs
+        ]
+
+    @app.get("/documents+json", response_model=List[Product], response_class=JSONResponse)
+    async def documents_json():
+        return docs
+
+    @app.get("/documents+orjson", response_model=List[Product], response_class=ORJSONResponse)
+    async def documents_orjson():
+        return docs
+
+    @app.get("/pre-serialized", response_model=List[Product])
+    async def pre_serialized():
+        return serialize(PRODUCT_LIST_ADAPTER, docs)
+
+    return app
+
+
+async def call(app, path):
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "headers": [],
+        "server": ("bench", 80),
+        "client": ("127.0.0.1", 1),
+    }
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = build_app(documents(args.items))
+    paths = ["/manual+json", "/documents+json", "/documents+orjson", "/pre-serialized"]
+    results = {}
+    for path in paths:
+        size = len(await call(app, path))
+        start = time.process_time()
+        for _ in range(args.requests):
+            await call(app, path)
+        results[path] = ((time.process_time() - start) / args.requests, size)
+
+    baseline = results[paths[0]][0]
+    print(f"{args.items} products per response, {args.requests} requests")
+    for path, (seconds, size) in results.items():
+        print(f"{path.lstrip('/'):<18}{seconds * 1e6:>10.1f} us CPU/response{size:>8} bytes{baseline / seconds:>8.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+"""
+MongoDB operations saved by batching `_id` lookups with DocumentLoader.
+
+Seeds a collection, then issues `--requests` random `_id` lookups with
+`--concurrency` callers in flight, once with a `find_one` per lookup and
+once through the loader, and reports lookups/s and MongoDB commands/s.
+
+Against a real server (default) the commands are counted with a pymongo
+CommandListener. `--in-memory` uses mongomock-motor instead and counts
+find/find_one calls; its timings carry no network round trip, so only the
+command counts are meaningful there.
+
+Usage (from the repository root, with a service's requirements installed):
+
+    python scripts/bench/loader_batching.py --uri mongodb://localhost:27017 --concurrency 500
+    python scripts/bench/loader_batching.py --in-memory
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "services", "inventory"))
+
+from pymongo import monitoring  # noqa: E402
+
+from app.loader import DocumentLoader  # noqa: E402
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name in ("find", "getMore"):
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class CountingCollection:
+    """Wraps a mongomock-motor collection, counting the reads it serves."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.count = 0
+
+    def find(self, *args, **kwargs):
+        self.count += 1
+        return self.collection.find(*args, **kwargs)
+
+    async def find_one(self, *args, **kwargs):
+        self.count += 1
+        return await self.collection.find_one(*args, **kwargs)
+
+
+async def run(lookup, ids, requests, concurrency):
+    queue = iter(random.choices(ids, k=requests))
+
+    async def worker():
+        for _id in queue:
+            doc = await lookup(_id)
+            assert doc is not None and doc["_id"] == _id
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--in-memory", action="store_true")
+    parser.add_argument("--documents", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--window-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.in_memory:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+        collection = CountingCollection(client.bench.loader)
+        seed_target, counter = collection.collection, collection
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        listener = CommandCounter()
+        client = AsyncIOMotorClient(args.uri, event_listeners=[listener])
+        collection = client.bench_loader.products
+        seed_target, counter = collection, listener
+
+    await seed_target.drop()
+    docs = [
+        {"name": f"product-{i}", "price": round(random.uniform(1, 500), 2), "stock": 100}
+        for i in range(args.documents)
+    ]
+    result = await seed_target.insert_many(docs)
+    ids = list(result.inserted_ids)
+
+    loader = DocumentLoader("bench", lambda: collection, window_ms=args.window_ms)
+    modes = {
+        "find_one": lambda _id: collection.find_one({"_id": _id}),
+        "loader": loader.load,
+    }
+
+    print(f"{args.requests} lookups, concurrency {args.concurrency}, window {args.window_ms} ms")
+    print(f"{'mode':<10}{'lookups/s':>12}{'commands':>12}{'commands/s':>12}")
+    for name, lookup in modes.items():
+        counter.count = 0
+        elapsed = await run(lookup, ids, args.requests, args.concurrency)
+        print(
+            f"{name:<10}{args.requests / elapsed:>12.0f}"
+            f"{counter.count:>12}{counter.count / elapsed:>12.0f}"
+        )
+
+    await seed_target.drop()
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
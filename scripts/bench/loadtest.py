@@ -0,0 +1,473 @@
+"""
+Load test for all four services with a regression gate.
+
+Each service runs in its own process (they all import as `app`), serving
+the real FastAPI app with uvicorn against either a local mongod or an
+in-memory Motor stand-in (mongomock-motor). Every service seeds synthetic
+data into a throwaway `bench_<service>` database before traffic starts.
+
+A pool of virtual users then runs a weighted mix of scenarios for
+`--duration` seconds:
+
+  browse    list a catalog page, open a product
+  checkout  check availability and create the order; the orders service's
+            checkout saga then reserves stock and pays against the bench
+            inventory and payments processes
+  poll      poll the payment status of an order
+  login     log in and fetch the profile
+
+and the harness reports requests/s and p50/p95/p99 per endpoint. Results
+are written as JSON; with `--baseline` the run fails (exit code 1) when an
+endpoint's p95 rises, its throughput drops or its error rate grows beyond
+`--tolerance` compared to that file. Only compare runs from the same
+machine and settings.
+
+Independently of the baseline, the run fails when any response reports
+more MongoDB calls (X-DB-Calls) than its endpoint's entry in
+DB_CALL_BUDGETS. mongomock emits no command events, so the budgets are
+only enforced against a real mongod.
+
+Usage (from the repository root, with the service requirements, httpx and,
+for --in-memory, mongomock-motor installed):
+
+    python scripts/bench/loadtest.py --uri mongodb://localhost:27017 --output bench.json
+    python scripts/bench/loadtest.py --in-memory --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+SERVICES = {"users": 8101, "inventory": 8102, "orders": 8103, "payments": 8104}
+PASSWORD = "bench-password"
+DEFAULT_MIX = "browse=60,checkout=10,poll=20,login=10"
+
+# Most MongoDB commands a single request to each endpoint may issue
+DB_CALL_BUDGETS = {
+    "GET /products": 1,
+    "GET /products/{product_id}": 1,
+    "POST /products/{product_id}/check-availability": 1,
+    # Order, outbox event and saga inserts, the read-back, and commitTransaction on a replica set
+    "POST /orders": 5,
+    "GET /payments/order/{order_id}": 1,
+    "POST /users/login": 1,
+    "GET /users/me": 2,
+}
+
+
+# Seeding (runs inside each service process, against its own database)
+
+async def seed_users(db, scale):
+    from app.auth import get_password_hash
+
+    # Hash once; argon2 would otherwise dominate seeding time
+    hashed = get_password_hash(PASSWORD)
+    now = datetime.utcnow()
+    await db.users.delete_many({})
+    emails = [f"bench-{i}@example.com" for i in range(scale["users"])]
+    await db.users.insert_many([
+        {
+            "email": email,
+            "name": f"Bench User {i}",
+            "phone": None,
+            "hashed_password": hashed,
+            "created_at": now,
+            "updated_at": now,
+            "is_active": True,
+        }
+        for i, email in enumerate(emails)
+    ])
+    return {"emails": emails}
+
+
+async def seed_inventory(db, scale):
+    now = datetime.utcnow()
+    categories = ["books", "electronics", "garden", "kitchen", "toys"]
+    await db.products.delete_many({})
+    products = [
+        {
+            "name": f"Product {i}",
+            "description": f"Synthetic product {i} for load testing",
+            "price": round(random.uniform(1, 500), 2),
+            "category": categories[i % len(categories)],
+            # Large enough that checkout never runs out during a run
+            "stock": 10 ** 9,
+            "reserved_stock": 0,
+            "image_url": None,
+            "created_at": now,
+            "updated_at": now,
+            "is_active": True,
+        }
+        for i in range(scale["products"])
+    ]
+    # insert_many sets `_id` on each document
+    await db.products.insert_many(products)
+    return {
+        "categories": categories,
+        "products": [
+            {"id": str(doc["_id"]), "name": doc["name"], "price": doc["price"]}
+            for doc in products
+        ],
+    }
+
+
+async def seed_orders(db, scale):
+    await db.orders.delete_many({})
+    return {}
+
+
+async def seed_payments(db, scale):
+    now = datetime.utcnow()
+    order_ids = [uuid.uuid4().hex for _ in range(scale["payments"])]
+    await db.payments.delete_many({})
+    await db.payments.insert_many([
+        {
+            "order_id": order_id,
+            "amount": 42.0,
+            "currency": "USD",
+            "payment_method": "credit_card",
+            "status": "completed",
+            "transaction_id": f"txn_{order_id[:16]}",
+            "created_at": now,
+            "updated_at": now,
+        }
+        for order_id in order_ids
+    ])
+    return {"order_ids": order_ids}
+
+
+SEEDERS = {
+    "users": seed_users,
+    "inventory": seed_inventory,
+    "orders": seed_orders,
+    "payments": seed_payments,
+}
+
+
+def serve(service, port, options, fixtures_queue):
+    service_dir = os.path.abspath(os.path.join(ROOT, "services", service))
+    sys.path.insert(0, service_dir)
+    os.chdir(service_dir)
+    os.environ.update({
+        "MONGODB_URI": options["uri"],
+        "MONGODB_DB_NAME": f"bench_{service}",
+        "LOG_LEVEL": "WARNING",
+        "LOG_SAMPLE_RATE": "0",
+        # The checkout saga calls the other bench services
+        "INVENTORY_SERVICE_URL": f"http://127.0.0.1:{SERVICES['inventory']}",
+        "PAYMENTS_SERVICE_URL": f"http://127.0.0.1:{SERVICES['payments']}",
+    })
+
+    import uvicorn
+    from app import database
+
+    if options["in_memory"]:
+        from mongomock_motor import AsyncMongoMockClient
+
+        database.AsyncIOMotorClient = lambda uri, **kwargs: AsyncMongoMockClient()
+        database.log_client_configuration = lambda: None
+
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(
+        app, host="127.0.0.1", port=port, log_config=None, access_log=False
+    ))
+
+    async def main():
+        serving = asyncio.ensure_future(server.serve())
+        while not server.started:
+            if serving.done():
+                serving.result()
+            await asyncio.sleep(0.05)
+        fixtures = await SEEDERS[service](database.get_database(), options["scale"])
+        fixtures_queue.put((service, fixtures))
+        await serving
+
+    asyncio.run(main())
+
+
+# Traffic
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.db_calls = {}
+
+    async def call(self, client, label, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.latencies.setdefault(label, []).append(time.perf_counter() - start)
+        if response is not None and "x-db-calls" in response.headers:
+            calls = int(response.headers["x-db-calls"])
+            self.db_calls[label] = max(self.db_calls.get(label, 0), calls)
+        if not ok:
+            self.errors[label] = self.errors.get(label, 0) + 1
+        return response if ok else None
+
+
+class Scenarios:
+    def __init__(self, clients, fixtures, recorder):
+        self.users = clients["users"]
+        self.inventory = clients["inventory"]
+        self.orders = clients["orders"]
+        self.payments = clients["payments"]
+        self.fixtures = fixtures
+        self.record = recorder.call
+
+    async def browse(self):
+        category = random.choice(self.fixtures["inventory"]["categories"])
+        await self.record(
+            self.inventory, "GET /products", "GET", "/api/v1/products",
+            params={"category": category, "limit": 20},
+        )
+        product = random.choice(self.fixtures["inventory"]["products"])
+        await self.record(
+            self.inventory, "GET /products/{product_id}", "GET", f"/api/v1/products/{product['id']}"
+        )
+
+    async def checkout(self):
+        product = random.choice(self.fixtures["inventory"]["products"])
+        quantity = random.randint(1, 3)
+        available = await self.record(
+            self.inventory, "POST /products/{product_id}/check-availability", "POST",
+            f"/api/v1/products/{product['id']}/check-availability", params={"quantity": quantity},
+        )
+        if available is None:
+            return
+        # Reservation and payment happen in the orders service's saga
+        await self.record(
+            self.orders, "POST /orders", "POST", "/api/v1/orders",
+            headers={"Authorization": "Bearer bench"},
+            json={
+                "items": [{
+                    "product_id": product["id"],
+                    "product_name": product["name"],
+                    "quantity": quantity,
+                    "price": product["price"],
+                }],
+                "shipping_address": {
+                    "street": "1 Bench Street",
+                    "city": "Loadville",
+                    "state": "LT",
+                    "postal_code": "00000",
+                    "country": "US",
+                },
+                "payment_method": "credit_card",
+            },
+        )
+
+    async def poll(self):
+        order_id = random.choice(self.fixtures["payments"]["order_ids"])
+        await self.record(
+            self.payments, "GET /payments/order/{order_id}", "GET", f"/api/v1/payments/order/{order_id}"
+        )
+
+    async def login(self):
+        email = random.choice(self.fixtures["users"]["emails"])
+        token = await self.record(
+            self.users, "POST /users/login", "POST", "/api/v1/users/login",
+            params={"email": email, "password": PASSWORD},
+        )
+        if token is None:
+            return
+        await self.record(
+            self.users, "GET /users/me", "GET", "/api/v1/users/me",
+            headers={"Authorization": f"Bearer {token.json()['access_token']}"},
+        )
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - {"browse", "checkout", "poll", "login"}
+    if unknown:
+        raise SystemExit(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return weights
+
+
+async def drive(fixtures, args):
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    clients = {
+        service: httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30)
+        for service, port in SERVICES.items()
+    }
+    scenarios = Scenarios(clients, fixtures, recorder)
+    weights = parse_mix(args.mix)
+    names, cumulative = list(weights), list(weights.values())
+
+    async def virtual_user(deadline):
+        while time.monotonic() < deadline:
+            name = random.choices(names, weights=cumulative)[0]
+            await getattr(scenarios, name)()
+
+    if args.warmup:
+        await asyncio.gather(*(virtual_user(time.monotonic() + args.warmup) for _ in range(args.users)))
+        recorder.latencies.clear()
+        recorder.errors.clear()
+        recorder.db_calls.clear()
+
+    start = time.monotonic()
+    await asyncio.gather(*(virtual_user(start + args.duration) for _ in range(args.users)))
+    elapsed = time.monotonic() - start
+
+    for client in clients.values():
+        await client.aclose()
+    return recorder, elapsed
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for label, latencies in sorted(recorder.latencies.items()):
+        latencies.sort()
+        errors = recorder.errors.get(label, 0)
+        endpoints[label] = {
+            "requests": len(latencies),
+            "errors": errors,
+            "error_rate": round(errors / len(latencies), 4),
+            "rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "db_calls_max": recorder.db_calls.get(label),
+        }
+    return endpoints
+
+
+def over_budget(endpoints):
+    return [
+        f"{label}: up to {row['db_calls_max']} MongoDB calls, budget {DB_CALL_BUDGETS[label]}"
+        for label, row in endpoints.items()
+        if row["db_calls_max"] is not None
+        and label in DB_CALL_BUDGETS
+        and row["db_calls_max"] > DB_CALL_BUDGETS[label]
+    ]
+
+
+def compare(current, baseline, tolerance):
+    regressions = []
+    for label, base in baseline["endpoints"].items():
+        now = current["endpoints"].get(label)
+        if now is None:
+            regressions.append(f"{label}: missing from this run")
+            continue
+        if base["p95_ms"] and now["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {base['p95_ms']} -> {now['p95_ms']} ms")
+        if base["rps"] and now["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{label}: rps {base['rps']} -> {now['rps']}")
+        if now["error_rate"] > base["error_rate"] + tolerance / 10:
+            regressions.append(f"{label}: error rate {base['error_rate']} -> {now['error_rate']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--in-memory", action="store_true", help="use mongomock-motor instead of mongod")
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--accounts", type=int, default=200)
+    parser.add_argument("--payments", type=int, default=500)
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--baseline", help="previous results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    options = {
+        "uri": args.uri,
+        "in_memory": args.in_memory,
+        "scale": {"products": args.products, "users": args.accounts, "payments": args.payments},
+    }
+    context = multiprocessing.get_context("spawn")
+    fixtures_queue = context.Queue()
+    processes = [
+        context.Process(target=serve, args=(service, port, options, fixtures_queue), daemon=True)
+        for service, port in SERVICES.items()
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        fixtures = dict(fixtures_queue.get(timeout=120) for _ in SERVICES)
+        recorder, elapsed = asyncio.run(drive(fixtures, args))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join(10)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "backend": "in-memory" if args.in_memory else "mongod",
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "users": args.users,
+            "duration_seconds": args.duration,
+            "mix": args.mix,
+            "scale": options["scale"],
+        },
+        "endpoints": summarize(recorder, elapsed),
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'endpoint':<48}{'requests':>10}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, row in results["endpoints"].items():
+        print(
+            f"{label:<48}{row['requests']:>10}{row['errors']:>8}{row['rps']:>9}"
+            f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}"
+        )
+    print(f"results written to {args.output}")
+
+    failed = False
+    violations = over_budget(results["endpoints"])
+    if violations:
+        failed = True
+        print("MongoDB call budgets exceeded:")
+        for violation in violations:
+            print(f"  {violation}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            failed = True
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+        else:
+            print("No regressions against baseline")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
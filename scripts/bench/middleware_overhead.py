@@ -0,0 +1,112 @@
+"""
+Per-request overhead of the correlation-ID middleware.
+
+Compares the old `@app.middleware("http")` implementation (Starlette's
+BaseHTTPMiddleware) with the pure ASGI RequestContextMiddleware, on a
+trivial endpoint, by calling the ASGI app directly so no network or
+server time is included.
+
+Usage (from the repository root, with a service's requirements installed):
+
+    python scripts/bench/middleware_overhead.py --requests 20000 --concurrency 100
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "services", "users"))
+
+from fastapi import FastAPI, Request  # noqa: E402
+
+from app.middleware import RequestContextMiddleware  # noqa: E402
+
+
+def build_app(kind: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    if kind == "base-http":
+        @app.middleware("http")
+        async def add_correlation_id(request: Request, call_next):
+            correlation_id = request.headers.get("X-Correlation-ID") or str(uuid.uuid4())
+            request.state.correlation_id = correlation_id
+            start_time = time.time()
+            response = await call_next(request)
+            process_time = time.time() - start_time
+            response.headers["X-Correlation-ID"] = correlation_id
+            response.headers["X-Process-Time"] = str(process_time)
+            return response
+    elif kind == "pure-asgi":
+        app.add_middleware(RequestContextMiddleware)
+
+    return app
+
+
+async def call(app, scope):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(dict(scope), receive, send)
+
+
+async def run(app, total: int, concurrency: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+    }
+    # Warm up routing and pydantic caches
+    for _ in range(200):
+        await call(app, scope)
+
+    per_worker = total // concurrency
+
+    async def worker():
+        for _ in range(per_worker):
+            await call(app, scope)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return per_worker * concurrency / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    # Measure middleware cost, not log formatting
+    logging.disable(logging.CRITICAL)
+
+    results = {}
+    for kind in ("none", "base-http", "pure-asgi"):
+        results[kind] = asyncio.run(run(build_app(kind), args.requests, args.concurrency))
+
+    baseline_us = 1e6 / results["none"]
+    for kind, rps in results.items():
+        overhead_us = 1e6 / rps - baseline_us
+        print(f"{kind:10s} {rps:10.0f} req/s  middleware overhead {overhead_us:7.1f} us/request")
+
+
+if __name__ == "__main__":
+    main()
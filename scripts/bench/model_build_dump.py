@@ -0,0 +1,121 @@
+"""
+Build/dump cost of product responses: manual construction vs documents.
+
+  manual    what the handlers did before: build Product(id=str(doc["_id"]), ...)
+            field by field, which FastAPI then dumps, re-validates against the
+            response model and serializes to JSON
+  document  return the Mongo document; FastAPI validates it once against the
+            response model (PyObjectId reads `_id` natively) and serializes it
+
+Both paths go through the same TypeAdapter calls FastAPI makes, on
+`--items` products per response, without any network or database time.
+
+Usage (from the repository root, with the inventory requirements installed):
+
+    python scripts/bench/model_build_dump.py --items 100 --rounds 2000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from typing import List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "services", "inventory"))
+
+from bson import ObjectId  # noqa: E402
+from pydantic import BaseModel, TypeAdapter  # noqa: E402
+
+from app.models import Product  # noqa: E402
+
+
+class LegacyProduct(BaseModel):
+    """Product as it was declared before the ObjectId type (id: str)."""
+
+    name: str
+    description: Optional[str] = None
+    price: float
+    category: str
+    stock: int = 0
+    image_url: Optional[str] = None
+    id: str
+    created_at: datetime
+    is_active: bool
+    reserved_stock: int
+
+
+def documents(count: int) -> List[dict]:
+    now = datetime.utcnow()
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"Product {i}",
+            "description": "A synthetic product used to measure serialization",
+            "price": 19.99 + i,
+            "category": "benchmarks",
+            "stock": 100,
+            "image_url": None,
+            "created_at": now,
+            "updated_at": now,
+            "is_active": True,
+            "reserved_stock": 0,
+        }
+        for i in range(count)
+    ]
+
+
+def manual(docs, adapter):
+    products = [
+        LegacyProduct(
+            id=str(p["_id"]),
+            name=p["name"],
+            description=p.get("description"),
+            price=p["price"],
+            category=p["category"],
+            stock=p["stock"],
+            image_url=p.get("image_url"),
+            created_at=p["created_at"],
+            is_active=p["is_active"],
+            reserved_stock=p.get("reserved_stock", 0),
+        )
+        for p in docs
+    ]
+    # FastAPI: dump the returned models, validate against response_model, serialize
+    content = [p.model_dump(by_alias=True) for p in products]
+    return adapter.dump_json(adapter.validate_python(content))
+
+
+def document(docs, adapter):
+    return adapter.dump_json(adapter.validate_python(docs))
+
+
+def measure(fn, docs, adapter, rounds):
+    fn(docs, adapter)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(docs, adapter)
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    docs = documents(args.items)
+    results = {
+        "manual": measure(manual, docs, TypeAdapter(List[LegacyProduct]), args.rounds),
+        "document": measure(document, docs, TypeAdapter(List[Product]), args.rounds),
+    }
+    baseline = results["manual"]
+    print(f"{args.items} products per response, {args.rounds} rounds")
+    for name, seconds in results.items():
+        print(
+            f"{name:<10}{seconds * 1e6:>10.1f} us/response"
+            f"{args.items / seconds:>12.0f} items/s{baseline / seconds:>8.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
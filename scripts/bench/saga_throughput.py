@@ -0,0 +1,178 @@
+"""
+Checkout saga throughput with local fakes of inventory and payments.
+
+Runs the orders app in-process and routes the saga's HTTP calls to a fake
+inventory/payments app through httpx's ASGI transport, so no other service
+is needed. Each fake call sleeps `--service-latency-ms`, and `--reject-rate`
+of the reservations fail with "Insufficient stock" to exercise the
+compensation path. `--requests` orders are created with `--concurrency`
+clients in flight; the script reports POST /orders latency (which should
+not include the saga) and how fast the sagas complete.
+
+Usage (from the repository root, with the orders requirements installed;
+--in-memory also needs mongomock-motor):
+
+    python scripts/bench/saga_throughput.py --uri mongodb://localhost:27017 --requests 2000
+    python scripts/bench/saga_throughput.py --in-memory --saga-concurrency 16 --saga-concurrency 256
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "services", "orders"))
+
+
+def fake_services(latency: float, reject_rate: float):
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI()
+    payments = {}
+
+    @app.post("/api/v1/products/{product_id}/reserve")
+    async def reserve(product_id: str):
+        await asyncio.sleep(latency)
+        if random.random() < reject_rate:
+            return JSONResponse({"detail": "Insufficient stock"}, status_code=400)
+        return {"message": "Stock reserved successfully"}
+
+    @app.post("/api/v1/products/{product_id}/release")
+    async def release(product_id: str):
+        await asyncio.sleep(latency)
+        return {"message": "Stock released successfully"}
+
+    @app.post("/api/v1/payments", status_code=201)
+    async def create_payment(body: dict):
+        await asyncio.sleep(latency)
+        payment = {"id": uuid.uuid4().hex[:24], "order_id": body["order_id"], "status": "completed"}
+        payments[body["order_id"]] = payment
+        return payment
+
+    @app.get("/api/v1/payments/order/{order_id}")
+    async def payment_by_order(order_id: str):
+        await asyncio.sleep(latency)
+        if order_id not in payments:
+            return JSONResponse({"detail": "Payment not found for this order"}, status_code=404)
+        return payments[order_id]
+
+    @app.post("/api/v1/payments/refund")
+    async def refund(body: dict):
+        await asyncio.sleep(latency)
+        return {"message": "Payment refunded successfully", "payment_id": body["payment_id"]}
+
+    return app
+
+
+def order_body(items: int) -> dict:
+    return {
+        "items": [
+            {"product_id": f"{i:024x}", "product_name": f"Product {i}", "quantity": 1 + i % 3, "price": 9.99}
+            for i in range(items)
+        ],
+        "shipping_address": {
+            "street": "1 Bench Street", "city": "Accra", "state": "GA", "postal_code": "00233", "country": "GH"
+        },
+        "payment_method": "stripe",
+    }
+
+
+async def run(args, saga_concurrency: int):
+    import httpx
+    from app import database
+    from app.config import settings
+    from app.main import app
+    from app.saga import SAGA_COLLECTION, checkout_saga
+
+    settings.SAGA_CONCURRENCY = saga_concurrency
+    checkout_saga.transport = httpx.ASGITransport(app=fake_services(args.service_latency_ms / 1000, args.reject_rate))
+
+    async with app.router.lifespan_context(app):
+        await database.db.db.orders.delete_many({})
+        await database.db.db[SAGA_COLLECTION].delete_many({})
+
+        body = order_body(args.items)
+        latencies = []
+        queue = asyncio.Queue()
+        for _ in range(args.requests):
+            queue.put_nowait(None)
+
+        async def client(http):
+            while not queue.empty():
+                queue.get_nowait()
+                start = time.perf_counter()
+                response = await http.post("/api/v1/orders", json=body, headers={"Authorization": "Bearer bench"})
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 201, response.text
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://orders") as http:
+            start = time.perf_counter()
+            await asyncio.gather(*[client(http) for _ in range(args.concurrency)])
+            accepted = time.perf_counter() - start
+            await checkout_saga.drain()
+            finished = time.perf_counter() - start
+
+        states = {}
+        async for saga in database.db.db[SAGA_COLLECTION].aggregate([{"$group": {"_id": "$state", "n": {"$sum": 1}}}]):
+            states[saga["_id"]] = saga["n"]
+
+    latencies.sort()
+    return {
+        "saga_concurrency": saga_concurrency,
+        "post_p50_ms": statistics.median(latencies) * 1000,
+        "post_p99_ms": latencies[int(0.99 * (len(latencies) - 1))] * 1000,
+        "accepted_per_s": args.requests / accepted,
+        "sagas_per_s": args.requests / finished,
+        "states": states,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--in-memory", action="store_true", help="use mongomock-motor instead of mongod")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50, help="clients posting orders")
+    parser.add_argument("--items", type=int, default=3, help="items per order (one reservation each)")
+    parser.add_argument("--service-latency-ms", type=float, default=5.0)
+    parser.add_argument("--reject-rate", type=float, default=0.05)
+    parser.add_argument("--saga-concurrency", type=int, action="append")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "MONGODB_URI": args.uri,
+        "MONGODB_DB_NAME": "bench_saga",
+        "LOG_LEVEL": "ERROR",  # compensations log a warning each
+        "LOG_SAMPLE_RATE": "0",
+        "LOOP_STALL_MONITOR_ENABLED": "false",
+        "ADMISSION_ENABLED": "false",
+        "SAGA_RECOVERY_INTERVAL_SECONDS": "3600",
+    })
+    if args.in_memory:
+        from mongomock_motor import AsyncMongoMockClient
+        from app import database
+
+        client = AsyncMongoMockClient()
+        database.AsyncIOMotorClient = lambda uri, **kwargs: client
+        database.log_client_configuration = lambda: None
+
+    print(
+        f"{args.requests} orders x {args.items} items, {args.concurrency} clients, "
+        f"{args.service_latency_ms} ms per fake call, {args.reject_rate:.0%} reservations rejected"
+    )
+    print(f"{'sagas':>6}{'POST p50':>10}{'POST p99':>10}{'accepted/s':>12}{'sagas/s':>10}  outcomes")
+    for saga_concurrency in args.saga_concurrency or [64]:
+        result = asyncio.run(run(args, saga_concurrency))
+        print(
+            f"{result['saga_concurrency']:>6}{result['post_p50_ms']:>10.1f}{result['post_p99_ms']:>10.1f}"
+            f"{result['accepted_per_s']:>12.0f}{result['sagas_per_s']:>10.0f}  {result['states']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Requests per second of the single-process uvicorn setup vs app/server.py.
+
+Starts a service twice on the same CPU set (pinned with taskset to mimic a
+container CPU limit) and drives GET /health with several client processes:
+
+  single    uvicorn app.main:app --loop asyncio --http h11
+            (what the orders/payments images ran before app/server.py)
+  launcher  python -m app.server (workers sized from the CPU set, uvloop, httptools)
+
+/health needs no database, so this isolates server and event-loop
+overhead; the Motor client is created lazily and never contacted.
+
+Usage (needs httpx and the service requirements):
+
+    python scripts/bench/server_rps.py --service inventory --cpus 0-3 --client-cpus 4-7
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+
+
+def start_server(service: str, mode: str, port: int, cpus: str) -> subprocess.Popen:
+    env = {**os.environ, "SERVER_PORT": str(port), "LOG_SAMPLE_RATE": "0", "LOG_LEVEL": "WARNING"}
+    if mode == "single":
+        command = [
+            sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+            "--loop", "asyncio", "--http", "h11", "--no-access-log",
+        ]
+    else:
+        command = [sys.executable, "-m", "app.server"]
+    if cpus:
+        command = ["taskset", "-c", cpus] + command
+    return subprocess.Popen(
+        command,
+        cwd=os.path.join(ROOT, "services", service),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_up(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not start")
+
+
+def client_process(url: str, concurrency: int, duration: float, results) -> None:
+    async def run():
+        done = 0
+        deadline = time.monotonic() + duration
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(limits=limits) as client:
+            async def worker():
+                nonlocal done
+                while time.monotonic() < deadline:
+                    await client.get(url)
+                    done += 1
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return done
+
+    results.put(asyncio.run(run()))
+
+
+def measure(url: str, clients: int, concurrency: int, duration: float, client_cpus: str) -> float:
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=client_process, args=(url, concurrency, duration, results))
+        for _ in range(clients)
+    ]
+    for process in processes:
+        process.start()
+        if client_cpus:
+            subprocess.run(["taskset", "-pc", client_cpus, str(process.pid)], stdout=subprocess.DEVNULL)
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--service", default="inventory")
+    parser.add_argument("--cpus", default="", help="taskset CPU list for the server, e.g. 0-3")
+    parser.add_argument("--client-cpus", default="", help="taskset CPU list for the load generator")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=32, help="connections per client process")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    for mode in ("single", "launcher"):
+        server = start_server(args.service, mode, args.port, args.cpus)
+        try:
+            url = f"http://127.0.0.1:{args.port}/health"
+            wait_until_up(url)
+            rps = measure(url, args.clients, args.concurrency, args.duration, args.client_cpus)
+            print(f"{mode:9s} {rps:10.0f} req/s")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Find the duplicate payments that stop the unique `payments.order_id` index
+from building (the payments service logs "Could not create unique order_id
+index" at startup when they exist).
+
+Duplicates were possible while create_payment checked and inserted without
+the index. By default the script only reports them, one order per line:
+
+    python scripts/dedupe_payments.py --uri mongodb://localhost:27017 --db platform_db
+
+With --apply it deletes, per order, the extra payments that never charged
+(pending or failed), keeping the earliest one that did. Orders with more
+than one completed or refunded payment are left alone and listed: those
+customers were charged twice and need a refund before the extra record is
+removed by hand. Restart the payments service afterwards to build the index.
+"""
+import argparse
+
+from pymongo import MongoClient
+
+UNCHARGED = ("pending", "failed")
+
+
+def duplicates(payments):
+    pipeline = [
+        {"$group": {"_id": "$order_id", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    for group in payments.aggregate(pipeline, allowDiskUse=True):
+        yield group["_id"], list(payments.find({"order_id": group["_id"]}).sort("created_at", 1))
+
+
+def pick(docs):
+    """The payment to keep and the ones that are safe to delete."""
+    charged = [doc for doc in docs if doc["status"] not in UNCHARGED]
+    keep = charged[0] if charged else docs[0]
+    return keep, [doc for doc in docs if doc is not keep and doc["status"] in UNCHARGED]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="platform_db")
+    parser.add_argument("--apply", action="store_true", help="delete the uncharged duplicates")
+    args = parser.parse_args()
+
+    payments = MongoClient(args.uri)[args.db].payments
+    orders = deleted = 0
+    double_charged = []
+    for order_id, docs in duplicates(payments):
+        orders += 1
+        keep, extra = pick(docs)
+        statuses = ", ".join(f"{doc['_id']}={doc['status']}" for doc in docs)
+        print(f"{order_id}: keep {keep['_id']} ({statuses})")
+        if len(docs) - len(extra) > 1:
+            double_charged.append(order_id)
+        if args.apply and extra:
+            deleted += payments.delete_many({"_id": {"$in": [doc["_id"] for doc in extra]}}).deleted_count
+
+    print(f"{orders} orders with duplicate payments, {deleted} payments deleted")
+    if double_charged:
+        print(f"{len(double_charged)} orders charged more than once, refund and remove by hand:")
+        for order_id in double_charged:
+            print(f"  {order_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Print span trees from the OTLP/JSON lines written by TRACING_EXPORTER=file.
+
+Point it at the trace files of every service involved in a request to see
+which hop dominated, e.g. for one slow checkout:
+
+    python scripts/trace_report.py services/*/traces.jsonl --correlation-id <id>
+
+Without --trace-id/--correlation-id the slowest --limit traces are shown.
+"""
+import argparse
+import json
+import uuid
+from collections import defaultdict
+
+
+def load_spans(paths):
+    spans = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                for resource in json.loads(line).get("resourceSpans", []):
+                    service = next(
+                        (a["value"]["stringValue"] for a in resource["resource"]["attributes"]
+                         if a["key"] == "service.name"),
+                        "unknown",
+                    )
+                    for scope in resource["scopeSpans"]:
+                        for span in scope["spans"]:
+                            span["service"] = service
+                            span["duration_ms"] = (
+                                int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])
+                            ) / 1e6
+                            spans.append(span)
+    return spans
+
+
+def print_tree(spans):
+    children = defaultdict(list)
+    ids = {span["spanId"] for span in spans}
+    roots = []
+    for span in spans:
+        parent = span.get("parentSpanId")
+        if parent and parent in ids:
+            children[parent].append(span)
+        else:
+            roots.append(span)
+
+    def walk(span, depth):
+        error = "  ERROR" if span["status"].get("code") == 2 else ""
+        print(f"{'  ' * depth}{span['duration_ms']:9.2f} ms  [{span['service']}] {span['name']}{error}")
+        for child in sorted(children[span["spanId"]], key=lambda s: int(s["startTimeUnixNano"])):
+            walk(child, depth + 1)
+
+    for root in sorted(roots, key=lambda s: int(s["startTimeUnixNano"])):
+        walk(root, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--trace-id")
+    parser.add_argument("--correlation-id")
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    traces = defaultdict(list)
+    for span in load_spans(args.files):
+        traces[span["traceId"]].append(span)
+
+    if args.correlation_id:
+        args.trace_id = uuid.UUID(args.correlation_id).hex
+    if args.trace_id:
+        selected = [args.trace_id] if args.trace_id in traces else []
+    else:
+        # Slowest first, measured by the longest span in each trace
+        selected = sorted(traces, key=lambda t: max(s["duration_ms"] for s in traces[t]), reverse=True)
+        selected = selected[:args.limit]
+
+    for trace_id in selected:
+        print(f"trace {trace_id}")
+        print_tree(traces[trace_id])
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+import asyncio
+import logging
+import time
+
+from bson import decode, encode
+
+from app.config import settings
+from app.metrics import Counter
+from app.singleflight import SingleFlight
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # optional: only needed for CACHE_BACKEND=redis
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_REQUESTS = Counter("cache_requests_total", "Two-tier cache lookups", ("cache", "result"))
+CACHE_INVALIDATIONS = Counter("cache_invalidations_total", "Keys invalidated cluster-wide", ("cache",))
+CACHE_BACKEND_ERRORS = Counter("cache_backend_errors_total", "Failed L2 operations", ("cache", "operation"))
+
+class CacheBackend:
+    """Shared (L2) store plus the pub/sub channel used for invalidations."""
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Set only if absent; used as a short-lived refresh lock."""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: str) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, channel: str) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+class InMemoryBackend(CacheBackend):
+    """
+    Process-local stand-in for Redis, for tests and single-process runs.
+    Several TwoTierCache instances sharing one backend behave like
+    replicas sharing a Redis.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    def _live(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._data[key]
+            return None
+        return value
+
+    async def get(self, key):
+        return self._live(key)
+
+    async def set(self, key, value, ttl):
+        self._data[key] = (value, time.monotonic() + ttl)
+
+    async def add(self, key, value, ttl):
+        if self._live(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, key):
+        self._data.pop(key, None)
+
+    async def publish(self, channel, message):
+        for queue in self._subscribers.get(channel, []):
+            queue.put_nowait(message)
+
+    async def subscribe(self, channel):
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(channel, []).append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[channel].remove(queue)
+
+class RedisBackend(CacheBackend):
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("CACHE_BACKEND=redis needs the redis package")
+        self._client = aioredis.from_url(url)
+
+    async def get(self, key):
+        return await self._client.get(key)
+
+    async def set(self, key, value, ttl):
+        await self._client.set(key, value, px=int(ttl * 1000))
+
+    async def add(self, key, value, ttl):
+        return bool(await self._client.set(key, value, px=int(ttl * 1000), nx=True))
+
+    async def delete(self, key):
+        await self._client.delete(key)
+
+    async def publish(self, channel, message):
+        await self._client.publish(channel, message)
+
+    async def subscribe(self, channel):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(channel)
+        try:
+            async for message in pubsub.listen():
+                data = message["data"]
+                yield data.decode() if isinstance(data, bytes) else data
+        finally:
+            await pubsub.aclose()
+
+    async def close(self):
+        await self._client.aclose()
+
+def create_backend() -> Optional[CacheBackend]:
+    if settings.CACHE_BACKEND == "redis":
+        return RedisBackend(settings.CACHE_REDIS_URL)
+    if settings.CACHE_BACKEND == "memory":
+        return InMemoryBackend()
+    return None
+
+class TwoTierCache:
+    """
+    Read-through cache: in-process LRU (L1) in front of a shared backend (L2).
+
+    Entries carry a soft TTL (when to refresh) and a hard TTL (when to
+    drop). Past the soft TTL the stale value is still served while one
+    background refresh per key reloads it; across replicas a short L2 lock
+    makes only one of them hit MongoDB. Lookups for a missing key share one
+    load. `invalidate()` deletes the L2 entry and publishes the key so every
+    replica drops its L1 copy; a load in flight when the invalidation
+    arrives returns its value but does not cache it. Values go through BSON, so Mongo documents
+    (ObjectId, datetime) round-trip unchanged; None caches "not found".
+
+    Without a backend the cache is disabled and every lookup calls the loader.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        backend: Optional[CacheBackend],
+        soft_ttl: Optional[float] = None,
+        hard_ttl: Optional[float] = None,
+        l1_ttl: Optional[float] = None,
+        l1_max_entries: Optional[int] = None
+    ):
+        self.name = name
+        self.backend = backend
+        self.soft_ttl = soft_ttl or settings.CACHE_SOFT_TTL_SECONDS
+        self.hard_ttl = hard_ttl or settings.CACHE_HARD_TTL_SECONDS
+        self.l1_ttl = l1_ttl or settings.CACHE_L1_TTL_SECONDS
+        self.l1_max_entries = l1_max_entries or settings.CACHE_L1_MAX_ENTRIES
+        self.channel = f"cache-invalidate:{name}"
+        self._l1: OrderedDict = OrderedDict()
+        self._loads = SingleFlight(f"cache:{name}")
+        self._refreshing: Set[str] = set()
+        # Loads in flight per key; invalidate() flags them so they skip caching
+        self._loading: Dict[str, List[dict]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._listener: Optional[asyncio.Task] = None
+        _caches.append(self)
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def _key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if self.backend is None:
+            return await loader()
+
+        now = time.time()
+        cached = self._l1.get(key)
+        if cached is not None:
+            value, soft_expires_at, l1_expires_at = cached
+            if now < l1_expires_at:
+                self._l1.move_to_end(key)
+                if now >= soft_expires_at:
+                    CACHE_REQUESTS.inc(self.name, "stale")
+                    self._refresh_in_background(key, loader)
+                else:
+                    CACHE_REQUESTS.inc(self.name, "l1_hit")
+                return value
+            del self._l1[key]
+
+        return await self._loads.do(key, lambda: self._get_shared(key, loader))
+
+    async def _get_shared(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            raw = await self.backend.get(self._key(key))
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.inc(self.name, "get")
+            logger.warning(f"Cache {self.name} L2 get failed: {str(e)}")
+            raw = None
+
+        if raw is not None:
+            envelope = decode(raw)
+            value, soft_expires_at = envelope["v"], envelope["s"]
+            self._remember(key, value, soft_expires_at)
+            if time.time() >= soft_expires_at:
+                CACHE_REQUESTS.inc(self.name, "stale")
+                self._refresh_in_background(key, loader)
+            else:
+                CACHE_REQUESTS.inc(self.name, "l2_hit")
+            return value
+
+        CACHE_REQUESTS.inc(self.name, "miss")
+        return await self._load(key, loader)
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        load = {"stale": False}
+        loads = self._loading.setdefault(key, [])
+        loads.append(load)
+        try:
+            value = await loader()
+            # Read before a write that has invalidated it since: don't cache
+            if load["stale"]:
+                return value
+            soft_expires_at = time.time() + self.soft_ttl
+            try:
+                await self.backend.set(self._key(key), encode({"v": value, "s": soft_expires_at}), self.hard_ttl)
+                if load["stale"]:
+                    # Invalidated while the set was on its way
+                    await self.backend.delete(self._key(key))
+                    return value
+            except Exception as e:
+                CACHE_BACKEND_ERRORS.inc(self.name, "set")
+                logger.warning(f"Cache {self.name} L2 set failed: {str(e)}")
+            self._remember(key, value, soft_expires_at)
+            return value
+        finally:
+            loads.remove(load)
+            if not loads:
+                del self._loading[key]
+
+    def _drop_local(self, key: str) -> None:
+        self._l1.pop(key, None)
+        for load in self._loading.get(key, ()):
+            load["stale"] = True
+
+    def _remember(self, key: str, value: Any, soft_expires_at: float) -> None:
+        self._l1[key] = (value, soft_expires_at, time.time() + self.l1_ttl)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_max_entries:
+            self._l1.popitem(last=False)
+
+    def _refresh_in_background(self, key: str, loader: Callable[[], Awaitable[Any]]) -> None:
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        task = asyncio.ensure_future(self._refresh(key, loader))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, key: str, loader: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            # One replica refreshes; the others keep serving the stale value
+            if await self.backend.add(self._key(key) + ":refresh", b"1", self.soft_ttl):
+                await self._load(key, loader)
+        except Exception as e:
+            logger.warning(f"Cache {self.name} refresh of {key} failed: {str(e)}")
+        finally:
+            self._refreshing.discard(key)
+
+    async def invalidate(self, key: str) -> None:
+        if self.backend is None:
+            return
+        self._drop_local(key)
+        CACHE_INVALIDATIONS.inc(self.name)
+        try:
+            await self.backend.delete(self._key(key))
+            await self.backend.publish(self.channel, key)
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.inc(self.name, "invalidate")
+            logger.warning(f"Cache {self.name} invalidation of {key} failed: {str(e)}")
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async for key in self.backend.subscribe(self.channel):
+                    self._drop_local(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                CACHE_BACKEND_ERRORS.inc(self.name, "subscribe")
+                logger.warning(f"Cache {self.name} invalidation listener failed: {str(e)}")
+                # Missed invalidations: L1 entries may be stale, drop them
+                self._l1.clear()
+                await asyncio.sleep(1)
+
+    def start(self) -> None:
+        if self.backend is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        for task in [self._listener, *self._tasks]:
+            if task:
+                task.cancel()
+        await asyncio.gather(*[t for t in [self._listener, *self._tasks] if t], return_exceptions=True)
+        self._listener = None
+
+_caches: List[TwoTierCache] = []
+
+cache_backend = create_backend()
+
+async def start_caches() -> None:
+    for cache in _caches:
+        cache.start()
+
+async def stop_caches() -> None:
+    for cache in _caches:
+        await cache.stop()
+    if cache_backend is not None:
+        await cache_backend.close()
@@ -0,0 +1,197 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import zlib
+
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:  # optional: br is only offered when installed
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd is only offered when installed
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    b"application/json",
+    b"application/javascript",
+    b"application/xml",
+    b"image/svg+xml",
+    b"text/",
+)
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        # Sync flush so every streamed chunk reaches the client immediately
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+class _Brotli:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+class _Zstd:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+def available_encodings() -> Dict[str, Callable]:
+    """Configured encodings, in server preference order, that can actually be produced."""
+    factories = {"gzip": lambda: _Gzip(settings.COMPRESSION_GZIP_LEVEL)}
+    if brotli is not None:
+        factories["br"] = lambda: _Brotli(settings.COMPRESSION_BROTLI_QUALITY)
+    if zstandard is not None:
+        factories["zstd"] = lambda: _Zstd(settings.COMPRESSION_ZSTD_LEVEL)
+    preferred = [name.strip() for name in settings.COMPRESSION_ENCODINGS.split(",") if name.strip()]
+    return {name: factories[name] for name in preferred if name in factories}
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+def negotiate(header: str, encodings: List[str]) -> Optional[str]:
+    """Highest-q encoding the client accepts; ties go to server preference."""
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for name in encodings:
+        q = accepted.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+class CompressionMiddleware:
+    """
+    Negotiates gzip/br/zstd from Accept-Encoding as pure ASGI.
+
+    Single-message bodies smaller than `minimum_size` go out untouched.
+    Streaming responses are compressed chunk by chunk and flushed after
+    each one, so nothing is buffered beyond the current chunk.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = available_encodings()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = negotiate(accept_encoding, list(self.encodings)) if accept_encoding else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingSender(send, encoding, self.encodings[encoding], self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+class _CompressingSender:
+    def __init__(self, send, encoding: str, factory: Callable, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.factory = factory
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def send(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            headers = message.get("headers", [])
+            if not self._compressible(message["status"], headers):
+                self.passthrough = True
+                await self._send(message)
+                return
+            # Hold the start message until the first body chunk decides
+            self.start_message = message
+            return
+
+        if message_type != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            headers = list(start.get("headers", []))
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                headers.append((b"vary", b"Accept-Encoding"))
+                await self._send({**start, "headers": headers})
+                await self._send(message)
+                return
+            self.compressor = self.factory()
+            headers = [
+                (name, _weaken_etag(value) if name == b"etag" else value)
+                for name, value in headers
+                if name != b"content-length"
+            ]
+            headers.append((b"content-encoding", self.encoding.encode()))
+            headers.append((b"vary", b"Accept-Encoding"))
+            if not more_body:
+                compressed = self.compressor.compress(body) + self.compressor.finish()
+                headers.append((b"content-length", str(len(compressed)).encode()))
+                await self._send({**start, "headers": headers})
+                await self._send({"type": "http.response.body", "body": compressed, "more_body": False})
+                return
+            await self._send({**start, "headers": headers})
+
+        chunk = self.compressor.compress(body) if body else b""
+        if not more_body:
+            chunk += self.compressor.finish()
+        if chunk or not more_body:
+            await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def _compressible(self, status_code: int, headers: List[Tuple[bytes, bytes]]) -> bool:
+        if status_code < 200 or status_code in (204, 304):
+            return False
+        content_type = b""
+        for name, value in headers:
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+def _weaken_etag(value: bytes) -> bytes:
+    # The compressed bytes differ from what the strong validator describes
+    return value if value.startswith(b"W/") else b"W/" + value
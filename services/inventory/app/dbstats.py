@@ -0,0 +1,54 @@
+from contextvars import ContextVar
+from typing import Optional
+import threading
+
+from bson import encode
+from pymongo import monitoring
+
+from app.config import settings
+
+class RequestDBStats:
+    """MongoDB round trips made on behalf of one request."""
+
+    __slots__ = ("commands", "reply_bytes", "duration_micros", "_lock")
+
+    def __init__(self):
+        self.commands = 0
+        self.reply_bytes = 0
+        self.duration_micros = 0
+        # Motor runs a request's concurrent commands on different executor threads
+        self._lock = threading.Lock()
+
+    def record(self, duration_micros: int, reply_bytes: int) -> None:
+        with self._lock:
+            self.commands += 1
+            self.duration_micros += duration_micros
+            self.reply_bytes += reply_bytes
+
+    @property
+    def duration_ms(self) -> float:
+        return self.duration_micros / 1000
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration_ms:.2f};desc="{self.commands} calls, {self.reply_bytes} bytes"'
+
+# Set by RequestContextMiddleware; commands issued from shared work (loader
+# batches, single-flight reads) count towards the request that started them
+db_stats_var: ContextVar[Optional[RequestDBStats]] = ContextVar("db_stats", default=None)
+
+class DBStatsListener(monitoring.CommandListener):
+    """Adds every MongoDB command to the stats of the request that issued it."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        stats = db_stats_var.get()
+        if stats is not None:
+            reply_bytes = len(encode(event.reply)) if settings.DB_STATS_REPLY_BYTES else 0
+            stats.record(event.duration_micros, reply_bytes)
+
+    def failed(self, event):
+        stats = db_stats_var.get()
+        if stats is not None:
+            stats.record(event.duration_micros, 0)
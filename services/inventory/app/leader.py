@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+import logging
+import os
+import socket
+import uuid
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.database import db
+from app.metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+LEASE_COLLECTION = "leader_leases"
+
+LEADER = Gauge("leader", "1 while this worker holds the named leader lease", ("lease",))
+
+class LeaderLease:
+    """
+    One holder at a time per `name`, backed by a document in MongoDB.
+
+    `acquire()` takes the lease when it is free or expired and renews it
+    when already held; call it before each unit of work, which must finish
+    within `ttl_seconds`. A worker that dies simply stops renewing, and
+    another takes over once the lease expires.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+
+    async def acquire(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            await db.db[LEASE_COLLECTION].find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {
+                    "owner": self.owner,
+                    "expires_at": now + timedelta(seconds=self.ttl_seconds),
+                    "renewed_at": now
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            held = True
+        except DuplicateKeyError:
+            # The filter missed because someone else holds it; the upsert collided
+            held = False
+        if held != self.is_leader:
+            logger.info(f"{'Acquired' if held else 'Lost'} leader lease {self.name}")
+        self.is_leader = held
+        LEADER.set(1.0 if held else 0.0, self.name)
+        return held
+
+    async def release(self) -> None:
+        if self.is_leader:
+            await db.db[LEASE_COLLECTION].delete_one({"_id": self.name, "owner": self.owner})
+            self.is_leader = False
+            LEADER.set(0.0, self.name)
@@ -0,0 +1,149 @@
+from collections import Counter as StackCounter, deque
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from app.config import settings
+from app.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+LOOP_STALLS = Counter("event_loop_stalls_total", "Callbacks that blocked the event loop past the threshold")
+
+_PREFIXES = sorted({p for p in sys.path if p and os.path.isdir(p)}, key=len, reverse=True)
+
+def _short_path(filename: str) -> str:
+    for prefix in _PREFIXES:
+        if filename.startswith(prefix):
+            return filename[len(prefix):].lstrip(os.sep)
+    return filename
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({_short_path(code.co_filename)})"
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+class SamplingProfiler:
+    """
+    Samples thread stacks from a background thread with sys._current_frames()
+    and aggregates them in collapsed-stack format ("root;...;leaf count"),
+    readable by flamegraph.pl, speedscope and inferno. The profiled threads
+    are never paused or instrumented, so the cost is the sampler's own CPU.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def run(self, thread_ids: Optional[List[int]], seconds: float, interval: float) -> str:
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("a profile is already running")
+        try:
+            samples = StackCounter()
+            me = threading.get_ident()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == me or (thread_ids is not None and thread_id not in thread_ids):
+                        continue
+                    samples[_collapse(frame)] += 1
+                time.sleep(interval)
+            return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+        finally:
+            self._lock.release()
+
+profiler = SamplingProfiler()
+
+class LoopStallMonitor:
+    """
+    Watchdog for callbacks that block the event loop.
+
+    A task on the loop stamps a heartbeat every `threshold / 4`; a watchdog
+    thread checks it and, once the heartbeat is older than the threshold,
+    captures and logs the loop thread's current stack, i.e. the code that is
+    blocking. Each stall is reported once. The threshold and on/off switch
+    are read on every check, so they can be changed at runtime.
+    """
+
+    def __init__(self, threshold_ms: float, enabled: bool = True, history: int = 20):
+        self.threshold_ms = threshold_ms
+        self.enabled = enabled
+        self.stalls = deque(maxlen=history)
+        self._heartbeat = time.monotonic()
+        self._reported = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def interval(self) -> float:
+        return max(self.threshold_ms / 4000, 0.005)
+
+    async def _beat(self) -> None:
+        while True:
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval):
+            if not self.enabled:
+                continue
+            heartbeat = self._heartbeat
+            blocked_ms = (time.monotonic() - heartbeat) * 1000
+            if blocked_ms < self.threshold_ms or self._reported == heartbeat:
+                continue
+            self._reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            LOOP_STALLS.inc()
+            self.stalls.append({
+                "at": time.time(),
+                "blocked_ms": round(blocked_ms, 1),
+                "stack": stack,
+            })
+            logger.warning(
+                f"Event loop blocked for {blocked_ms:.0f}ms (threshold {self.threshold_ms:.0f}ms)\n{stack}"
+            )
+
+    def start(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._beat())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-stall-monitor", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def status(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold_ms,
+            "recent_stalls": list(self.stalls),
+        }
+
+loop_monitor = LoopStallMonitor(settings.LOOP_STALL_THRESHOLD_MS, settings.LOOP_STALL_MONITOR_ENABLED)
@@ -1,15 +1,52 @@
-from fastapi import APIRouter, HTTPException, status, Query
+from fastapi import APIRouter, HTTPException, status, Query, Request, Response
 from typing import List, Optional
+from collections import defaultdict
 import logging
 
-from app.models import ProductCreate, Product, ProductUpdate, StockCheck, StockReservation
-from app.database import get_database
+from app.models import (
+    ProductCreate,
+    Product,
+    ProductUpdate,
+    StockCheck,
+    StockReservation,
+    StockReleaseBatch,
+    PRODUCT_LIST_ADAPTER
+)
+from app.database import get_database, get_collection
+from app.config import settings
+from app.etag import ETAG_PROJECTION, compute_etag, is_conditional, etag_matches, not_modified, set_cache_headers
+from app.singleflight import SingleFlight
+from app.cache import TwoTierCache, cache_backend
+from app.loader import DocumentLoader
+from app.outbox import record_event, run_in_transaction
+from app.serialization import serialize
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Concurrent GETs for the same product share one in-flight lookup
+product_reads = SingleFlight("product")
+
+# Product documents shared across replicas; writes below invalidate them
+product_cache = TwoTierCache("product", cache_backend)
+
+def catalog_products():
+    # Browsing may be served by secondaries; stock checks and writes use `db.products`
+    return get_collection(
+        "products",
+        read_preference=settings.CATALOG_READ_PREFERENCE,
+        read_concern=settings.CATALOG_READ_CONCERN
+    )
+
+# Concurrent _id lookups are resolved with one $in query per window; catalog
+# reads follow the catalog read preference, stock checks stay on the primary
+catalog_loader = DocumentLoader("products", catalog_products)
+stock_loader = DocumentLoader("products_primary", lambda: get_database().products)
+
 @router.post("/products", response_model=Product, status_code=status.HTTP_201_CREATED)
 async def create_product(product: ProductCreate):
     db = get_database()
@@ -25,18 +62,7 @@ async def create_product(product: ProductCreate):
     
     logger.info(f"Product created: {product.name}")
     
-    return Product(
-        id=str(created_product["_id"]),
-        name=created_product["name"],
-        description=created_product.get("description"),
-        price=created_product["price"],
-        category=created_product["category"],
-        stock=created_product["stock"],
-        image_url=created_product.get("image_url"),
-        created_at=created_product["created_at"],
-        is_active=created_product["is_active"],
-        reserved_stock=created_product["reserved_stock"]
-    )
+    return created_product
 
 @router.get("/products", response_model=List[Product])
 async def list_products(
@@ -45,8 +71,6 @@ async def list_products(
     category: Optional[str] = None,
     search: Optional[str] = None
 ):
-    db = get_database()
-    
     query = {"is_active": True}
     
     if category:
@@ -55,49 +79,44 @@ async def list_products(
     if search:
         query["name"] = {"$regex": search, "$options": "i"}
     
-    cursor = db.products.find(query).skip(skip).limit(limit)
+    cursor = catalog_products().find(query).skip(skip).limit(limit)
     products = await cursor.to_list(length=limit)
     
-    return [
-        Product(
-            id=str(p["_id"]),
-            name=p["name"],
-            description=p.get("description"),
-            price=p["price"],
-            category=p["category"],
-            stock=p["stock"],
-            image_url=p.get("image_url"),
-            created_at=p["created_at"],
-            is_active=p["is_active"],
-            reserved_stock=p.get("reserved_stock", 0)
-        )
-        for p in products
-    ]
+    return serialize(PRODUCT_LIST_ADAPTER, products)
 
 @router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
-    db = get_database()
-    
+async def get_product(product_id: str, request: Request, response: Response):
     if not ObjectId.is_valid(product_id):
         raise HTTPException(status_code=400, detail="Invalid product ID")
     
-    product = await db.products.find_one({"_id": ObjectId(product_id)})
+    cache_control = f"public, max-age={settings.PRODUCT_CACHE_MAX_AGE}, must-revalidate"
+    
+    # Revalidate against the timestamps only, skipping the full document
+    if is_conditional(request):
+        stamp = await product_reads.do(
+            ("stamp", product_id),
+            lambda: catalog_products().find_one({"_id": ObjectId(product_id)}, ETAG_PROJECTION)
+        )
+        if not stamp:
+            raise HTTPException(status_code=404, detail="Product not found")
+        etag = compute_etag(stamp)
+        if etag_matches(request, etag):
+            return not_modified(etag, cache_control)
+    
+    product = await product_cache.get_or_load(
+        product_id,
+        lambda: product_reads.do(
+            ("product", product_id),
+            lambda: catalog_loader.load(ObjectId(product_id))
+        )
+    )
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    return Product(
-        id=str(product["_id"]),
-        name=product["name"],
-        description=product.get("description"),
-        price=product["price"],
-        category=product["category"],
-        stock=product["stock"],
-        image_url=product.get("image_url"),
-        created_at=product["created_at"],
-        is_active=product["is_active"],
-        reserved_stock=product.get("reserved_stock", 0)
-    )
+    set_cache_headers(response, compute_etag(product), cache_control)
+    
+    return product
 
 @router.put("/products/{product_id}", response_model=Product)
 async def update_product(product_id: str, product_update: ProductUpdate):
@@ -113,33 +132,21 @@ async def update_product(product_id: str, product_update: ProductUpdate):
             {"_id": ObjectId(product_id)},
             {"$set": update_data}
         )
+        await product_cache.invalidate(product_id)
     
     product = await db.products.find_one({"_id": ObjectId(product_id)})
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    return Product(
-        id=str(product["_id"]),
-        name=product["name"],
-        description=product.get("description"),
-        price=product["price"],
-        category=product["category"],
-        stock=product["stock"],
-        image_url=product.get("image_url"),
-        created_at=product["created_at"],
-        is_active=product["is_active"],
-        reserved_stock=product.get("reserved_stock", 0)
-    )
+    return product
 
 @router.post("/products/{product_id}/check-availability", response_model=StockCheck)
 async def check_availability(product_id: str, quantity: int = Query(..., gt=0)):
-    db = get_database()
-    
     if not ObjectId.is_valid(product_id):
         raise HTTPException(status_code=400, detail="Invalid product ID")
     
-    product = await db.products.find_one({"_id": ObjectId(product_id)})
+    product = await stock_loader.load(ObjectId(product_id))
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -160,21 +167,46 @@ async def reserve_stock(reservation: StockReservation):
     if not ObjectId.is_valid(reservation.product_id):
         raise HTTPException(status_code=400, detail="Invalid product ID")
     
-    product = await db.products.find_one({"_id": ObjectId(reservation.product_id)})
-    
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    available_stock = product["stock"] - product.get("reserved_stock", 0)
+    # One reservation per (order, product), so a retried request is
+    # acknowledged instead of reserving twice
+    reservation_id = f"{reservation.order_id}:{reservation.product_id}"
     
-    if available_stock < reservation.quantity:
+    # Reserve stock
+    async def write(session):
+        await db.stock_reservations.insert_one(
+            {**reservation.model_dump(), "_id": reservation_id, "created_at": datetime.utcnow()},
+            session=session
+        )
+        # Conditional on availability, so concurrent reservations cannot oversell
+        result = await db.products.update_one(
+            {
+                "_id": ObjectId(reservation.product_id),
+                "$expr": {"$gte": [
+                    {"$subtract": ["$stock", {"$ifNull": ["$reserved_stock", 0]}]},
+                    reservation.quantity
+                ]}
+            },
+            {"$inc": {"reserved_stock": reservation.quantity}, "$set": {"updated_at": datetime.utcnow()}},
+            session=session
+        )
+        if result.matched_count == 0:
+            await db.stock_reservations.delete_one({"_id": reservation_id}, session=session)
+            return False
+        await record_event("stock.reserved", reservation.product_id, reservation.model_dump(), session=session)
+        return True
+    
+    try:
+        reserved = await run_in_transaction(write)
+    except DuplicateKeyError:
+        logger.info(f"Product {reservation.product_id} already reserved for order {reservation.order_id}")
+        return {"message": "Stock reserved successfully"}
+    
+    if not reserved:
+        if not await db.products.find_one({"_id": ObjectId(reservation.product_id)}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Product not found")
         raise HTTPException(status_code=400, detail="Insufficient stock")
     
-    # Reserve stock
-    await db.products.update_one(
-        {"_id": ObjectId(reservation.product_id)},
-        {"$inc": {"reserved_stock": reservation.quantity}}
-    )
+    await product_cache.invalidate(reservation.product_id)
     
     logger.info(f"Reserved {reservation.quantity} of product {reservation.product_id} for order {reservation.order_id}")
     
@@ -187,12 +219,88 @@ async def release_stock(reservation: StockReservation):
     if not ObjectId.is_valid(reservation.product_id):
         raise HTTPException(status_code=400, detail="Invalid product ID")
     
-    # Release stock
-    await db.products.update_one(
-        {"_id": ObjectId(reservation.product_id)},
-        {"$inc": {"reserved_stock": -reservation.quantity}}
-    )
+    # Release stock; only a reservation still on record is released, so retries are no-ops
+    async def write(session):
+        result = await db.stock_reservations.delete_one(
+            # Not one a release-batch has claimed and is counting
+            {"_id": f"{reservation.order_id}:{reservation.product_id}", "released_by": {"$exists": False}},
+            session=session
+        )
+        if result.deleted_count == 0:
+            return False
+        await db.products.update_one(
+            {"_id": ObjectId(reservation.product_id)},
+            {"$inc": {"reserved_stock": -reservation.quantity}, "$set": {"updated_at": datetime.utcnow()}},
+            session=session
+        )
+        await record_event("stock.released", reservation.product_id, reservation.model_dump(), session=session)
+        return True
+    
+    if not await run_in_transaction(write):
+        logger.info(f"No reservation of product {reservation.product_id} left for order {reservation.order_id}")
+        return {"message": "Stock released successfully"}
+    
+    await product_cache.invalidate(reservation.product_id)
     
     logger.info(f"Released {reservation.quantity} of product {reservation.product_id} for order {reservation.order_id}")
     
     return {"message": "Stock released successfully"}
+
+@router.post("/products/release-batch")
+async def release_stock_batch(batch: StockReleaseBatch):
+    """
+    Release every reservation still on record for the given orders in a few
+    writes. Quantities come from the reservation records, so replaying a
+    batch (or racing a per-product release) releases nothing twice.
+    """
+    db = get_database()
+    # Per call: two calls (or a replay) never claim the same records
+    claim = f"{batch.batch_id}:{ObjectId()}"
+    
+    async def write(session):
+        # Claim the records first, so a concurrent call cannot count them too
+        await db.stock_reservations.update_many(
+            {"order_id": {"$in": batch.order_ids}, "released_by": {"$exists": False}},
+            {"$set": {"released_by": claim}},
+            session=session
+        )
+        quantities = defaultdict(int)
+        async for reservation in db.stock_reservations.find(
+            {"released_by": claim}, {"product_id": 1, "quantity": 1}, session=session
+        ):
+            quantities[reservation["product_id"]] += reservation["quantity"]
+        if not quantities:
+            return {}
+        now = datetime.utcnow()
+        await db.products.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": ObjectId(product_id)},
+                    {"$inc": {"reserved_stock": -quantity}, "$set": {"updated_at": now}}
+                )
+                for product_id, quantity in quantities.items()
+            ],
+            ordered=False,
+            session=session
+        )
+        await record_event(
+            "stock.released_batch",
+            batch.batch_id,
+            {
+                "batch_id": batch.batch_id,
+                "order_ids": batch.order_ids,
+                "items": [{"product_id": p, "quantity": q} for p, q in quantities.items()]
+            },
+            session=session
+        )
+        await db.stock_reservations.delete_many({"released_by": claim}, session=session)
+        return quantities
+    
+    released = await run_in_transaction(write)
+    
+    for product_id in released:
+        await product_cache.invalidate(product_id)
+    if released:
+        logger.info(f"Released batch {batch.batch_id}: {len(released)} products")
+    
+    return {"message": "Stock released successfully", "batch_id": batch.batch_id, "applied": bool(released)}
@@ -0,0 +1,125 @@
+"""
+Production entrypoint: `python -m app.server`.
+
+Runs uvicorn with uvloop and httptools, one worker per CPU the container
+may use, and drains in-flight requests on SIGTERM before the lifespan
+shutdown closes the MongoDB client. `python -m app.main` remains the
+auto-reloading development server.
+
+Workers share nothing: metrics, slow-query and profiler state, admission
+limits and readiness are per process, and each /metrics or /debug request
+reaches one worker. Metric series carry a `worker` label (aggregate with
+`sum without (worker)`) and /debug and /metrics responses an X-Worker
+header; set WEB_CONCURRENCY=1 to profile or inspect a single process.
+"""
+from typing import Optional
+import logging
+import math
+import os
+import signal
+import threading
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """CPU quota of this container in cores, or None when unlimited."""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    # cgroup v1
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+def worker_count() -> int:
+    if settings.WEB_CONCURRENCY:
+        return settings.WEB_CONCURRENCY
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, limit)
+    # Round down: a worker per fractional core would just be throttled
+    return max(1, math.floor(cpus))
+
+class DrainingServer(uvicorn.Server):
+    """
+    On the first SIGTERM, report not-ready for SERVER_DRAIN_DELAY_SECONDS
+    while still serving, so load balancers stop routing here before uvicorn
+    stops accepting connections and waits for in-flight requests.
+    """
+
+    def handle_exit(self, sig, frame):
+        delay = settings.SERVER_DRAIN_DELAY_SECONDS
+        if sig != signal.SIGTERM or delay <= 0 or self.should_exit:
+            super().handle_exit(sig, frame)
+            return
+        from app.main import app as application
+
+        if getattr(application.state, "draining", False):
+            return
+        application.state.draining = True
+        timer = threading.Timer(delay, super().handle_exit, (sig, frame))
+        timer.daemon = True
+        timer.start()
+
+def main():
+    workers = worker_count()
+
+    if workers == 1:
+        # Single process: import the app here so startup errors surface
+        # before binding, and pass the object straight to uvicorn
+        from app.main import app as target
+    else:
+        # Each worker imports the app itself; nothing (notably the Motor
+        # client, created in the lifespan) is shared across processes
+        target = "app.main:app"
+        from app.logging_config import setup_logging
+
+        setup_logging(settings.SERVICE_NAME, settings.LOG_LEVEL).start()
+
+    config = uvicorn.Config(
+        target,
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEP_ALIVE_SECONDS,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+        limit_concurrency=settings.SERVER_LIMIT_CONCURRENCY,
+        access_log=False,  # RequestContextMiddleware writes the access log
+        log_config=None
+    )
+    server = DrainingServer(config)
+
+    logger.info(
+        f"Starting {settings.SERVICE_NAME} with {workers} worker(s), "
+        f"cgroup CPU limit {cgroup_cpu_limit() or 'none'}"
+    )
+    if workers > 1:
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+from collections import deque
+from typing import Iterable, Optional
+import asyncio
+import json
+import re
+import time
+
+from app.config import settings
+from app.metrics import Counter, Gauge, Histogram
+
+ADMISSION_LIMIT = Gauge("admission_limit", "Current adaptive concurrency limit", ("group",))
+ADMISSION_IN_FLIGHT = Gauge("admission_in_flight", "Admitted requests in progress", ("group",))
+ADMISSION_QUEUED = Gauge("admission_queued", "Requests waiting for admission", ("group",))
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections_total", "Requests shed with 503", ("group", "reason")
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    "admission_queue_wait_seconds", "Time admitted requests spent queued", ("group",)
+)
+
+# Never shed probes, metrics or debugging endpoints
+EXEMPT_PREFIXES = ("/health", "/ready", "/metrics", "/debug", "/docs", "/openapi.json")
+
+class RouteGroup:
+    """
+    Requests sharing one concurrency limit. Groups with a higher `priority`
+    win: while one of them has requests queued, lower-priority groups shed
+    new arrivals immediately instead of competing for the database.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        priority: int,
+        methods: Optional[Iterable[str]] = None,
+        path_pattern: Optional[str] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout_ms: Optional[float] = None
+    ):
+        self.name = name
+        self.priority = priority
+        self.methods = set(methods) if methods else None
+        self.pattern = re.compile(path_pattern) if path_pattern else None
+        self.max_queue = max_queue if max_queue is not None else settings.ADMISSION_MAX_QUEUE
+        self.queue_timeout = (queue_timeout_ms or settings.ADMISSION_QUEUE_TIMEOUT_MS) / 1000
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.methods and method not in self.methods:
+            return False
+        return self.pattern is None or bool(self.pattern.match(path))
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit: grows by 1/limit per fast completion while the
+    limit is in use, and shrinks multiplicatively (at most once per latency
+    target interval) when requests are slow or fail with 5xx.
+    """
+
+    def __init__(self, group: RouteGroup):
+        self.group = group
+        self.limit = float(settings.ADMISSION_INITIAL_LIMIT)
+        self.in_flight = 0
+        self.waiters = deque()
+        self.latency_target = settings.ADMISSION_LATENCY_TARGET_MS / 1000
+        self._last_decrease = 0.0
+        ADMISSION_LIMIT.set(self.limit, group.name)
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def acquire(self) -> Optional[str]:
+        """Take a slot; returns the rejection reason if the request must be shed."""
+        if self._has_capacity() and not self.waiters:
+            self._admit()
+            return None
+        if len(self.waiters) >= self.group.max_queue:
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        ADMISSION_QUEUED.set(len(self.waiters), self.group.name)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.group.queue_timeout)
+        except asyncio.TimeoutError:
+            # The slot may have been handed over just as the deadline hit
+            if waiter.done() and not waiter.cancelled():
+                return None
+            self._forget(waiter)
+            return "timeout"
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(0.0, overloaded=False)
+            else:
+                self._forget(waiter)
+            raise
+        ADMISSION_QUEUE_WAIT.observe(time.perf_counter() - start, self.group.name)
+        return None
+
+    def _forget(self, waiter: asyncio.Future) -> None:
+        try:
+            self.waiters.remove(waiter)
+        except ValueError:
+            pass
+        ADMISSION_QUEUED.set(len(self.waiters), self.group.name)
+
+    def _admit(self) -> None:
+        self.in_flight += 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight, self.group.name)
+
+    def release(self, latency: float, overloaded: bool) -> None:
+        at_limit = self.in_flight >= int(self.limit) or bool(self.waiters)
+        self.in_flight -= 1
+        now = time.monotonic()
+        if overloaded or latency > self.latency_target:
+            if now - self._last_decrease >= self.latency_target:
+                self.limit = max(
+                    float(settings.ADMISSION_MIN_LIMIT),
+                    self.limit * settings.ADMISSION_BACKOFF_RATIO
+                )
+                self._last_decrease = now
+        elif at_limit:
+            # Only probe upwards when the current limit is actually the bottleneck
+            self.limit = min(float(settings.ADMISSION_MAX_LIMIT), self.limit + 1 / self.limit)
+
+        while self.waiters and self._has_capacity():
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self._admit()
+                waiter.set_result(None)
+
+        ADMISSION_LIMIT.set(self.limit, self.group.name)
+        ADMISSION_IN_FLIGHT.set(self.in_flight, self.group.name)
+        ADMISSION_QUEUED.set(len(self.waiters), self.group.name)
+
+class AdmissionController:
+    def __init__(self, groups: Iterable[RouteGroup], default_group: RouteGroup):
+        self.limiters = [AdaptiveLimiter(group) for group in groups]
+        self.default = AdaptiveLimiter(default_group)
+        self._all = self.limiters + [self.default]
+
+    def limiter_for(self, method: str, path: str) -> AdaptiveLimiter:
+        for limiter in self.limiters:
+            if limiter.group.matches(method, path):
+                return limiter
+        return self.default
+
+    def outranked(self, limiter: AdaptiveLimiter) -> bool:
+        return any(
+            other.waiters
+            for other in self._all
+            if other.group.priority > limiter.group.priority
+        )
+
+class AdmissionControlMiddleware:
+    """Sheds excess load with a fast 503 + Retry-After before it reaches MongoDB."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+        self.rejection_body = json.dumps({"error": "Service overloaded, retry later"}).encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.controller.limiter_for(scope["method"], scope["path"])
+        if self.controller.outranked(limiter):
+            reason = "priority"
+        else:
+            reason = await limiter.acquire()
+        if reason:
+            ADMISSION_REJECTIONS.inc(limiter.group.name, reason)
+            await self._reject(send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            limiter.release(time.perf_counter() - start, overloaded=status_code >= 500)
+
+    async def _reject(self, send):
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(self.rejection_body)).encode()),
+                (b"retry-after", str(settings.ADMISSION_RETRY_AFTER_SECONDS).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": self.rejection_body})
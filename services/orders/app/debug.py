@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import asyncio
+import secrets
+import threading
+
+from app.config import settings
+from app.slowquery import slow_queries
+from app.profiling import profiler, loop_monitor
+
+async def verify_debug_access(x_debug_token: Optional[str] = Header(None)):
+    """/debug is off until DEBUG_TOKEN is set, and then requires a matching X-Debug-Token."""
+    if not settings.DEBUG_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_debug_token or not secrets.compare_digest(x_debug_token, settings.DEBUG_TOKEN):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid debug token")
+
+router = APIRouter(prefix="/debug", dependencies=[Depends(verify_debug_access)])
+
+@router.get("/slow-queries")
+async def get_slow_queries(limit: int = Query(20, ge=1, le=1000)):
+    """Slowest query shapes by cumulative time, with their explain plan summaries"""
+    return {
+        "threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "shapes": slow_queries.top(limit)
+    }
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_slow_queries():
+    slow_queries.reset()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10, gt=0, le=settings.PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(settings.PROFILE_INTERVAL_MS, ge=1, le=1000),
+    all_threads: bool = False
+):
+    """
+    Sample this worker's stacks for `seconds` and return them collapsed
+    ("frame;frame;frame count" per line), ready for flamegraph.pl or speedscope.
+    Only the event loop thread is sampled unless `all_threads` is set.
+    """
+    if profiler.running:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A profile is already running")
+    thread_ids = None if all_threads else [threading.get_ident()]
+    try:
+        stacks = await asyncio.to_thread(profiler.run, thread_ids, seconds, interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return PlainTextResponse(stacks)
+
+@router.get("/loop-monitor")
+async def get_loop_monitor():
+    return loop_monitor.status()
+
+@router.put("/loop-monitor")
+async def update_loop_monitor(
+    threshold_ms: Optional[float] = Query(None, gt=0),
+    enabled: Optional[bool] = None
+):
+    """Change the stall threshold or switch the monitor on/off without a restart"""
+    if threshold_ms is not None:
+        loop_monitor.threshold_ms = threshold_ms
+    if enabled is not None:
+        loop_monitor.enabled = enabled
+    return loop_monitor.status()
@@ -0,0 +1,258 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+
+import httpx
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+
+from app.config import settings
+from app.database import db
+from app.leader import LeaderLease
+from app.metrics import Counter
+from app.models import OrderStatus
+from app.outbox import OUTBOX_COLLECTION, new_event, run_in_transaction
+from app.saga import SAGA_COLLECTION, COMPENSATING, CONFIRMING, PAYING, RESERVING
+from app.tracing import traced_request
+
+logger = logging.getLogger(__name__)
+
+# Saga states owned by the expiry job (not resumed by the saga recovery loop)
+EXPIRING = "expiring"  # claimed by a batch; its cancel and stock release are retried until done
+EXPIRED = "expired"
+STUCK_STATES = [RESERVING, PAYING, CONFIRMING]
+
+ORDERS_EXPIRED = Counter("orders_expired_total", "Pending orders cancelled by the expiry job")
+STOCK_RELEASE_BATCHES = Counter("order_expiry_release_batches_total", "Aggregated stock releases sent to inventory", ("outcome",))
+
+class OrderExpiry:
+    """
+    Cancels orders left PENDING for longer than ORDER_PENDING_TTL_MINUTES.
+
+    Runs on the replica holding the "order-expiry" leader lease. Each batch
+    is read from the (status, created_at) index and cancelled with one
+    bulk_write, together with its order.cancelled events. Their stock is
+    released with one request to inventory's release-batch endpoint, which
+    releases whatever reservations it still holds for those orders; a batch
+    whose release failed is simply resent on the next run.
+
+    Orders whose saga is still running (lease not expired) or compensating
+    are left alone. Stuck sagas that may already have charged the customer
+    are switched to compensating instead, so the saga refunds as well.
+    """
+
+    def __init__(self):
+        self.lease = LeaderLease("order-expiry", settings.ORDER_EXPIRY_LEASE_SECONDS)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> int:
+        """Expire up to ORDER_EXPIRY_MAX_BATCHES batches; returns the number of orders cancelled."""
+        expired = await self._retry_pending_releases()
+
+        cutoff = datetime.utcnow() - timedelta(minutes=settings.ORDER_PENDING_TTL_MINUTES)
+        skipped: List[ObjectId] = []
+        for _ in range(settings.ORDER_EXPIRY_MAX_BATCHES):
+            if not await self.lease.acquire():
+                break
+            found, cancelled = await self._expire_batch(cutoff, skipped)
+            expired += cancelled
+            if found < settings.ORDER_EXPIRY_BATCH_SIZE:
+                break
+        if expired:
+            logger.info(f"Expired {expired} pending orders older than {cutoff.isoformat()}")
+        return expired
+
+    async def _expire_batch(self, cutoff: datetime, skipped: List[ObjectId]) -> Tuple[int, int]:
+        query = {"status": OrderStatus.PENDING, "created_at": {"$lt": cutoff}}
+        if skipped:
+            query["_id"] = {"$nin": skipped}
+        orders = await db.db.orders.find(query, {"user_id": 1, "items": 1}).sort(
+            "created_at", ASCENDING
+        ).limit(settings.ORDER_EXPIRY_BATCH_SIZE).to_list(length=settings.ORDER_EXPIRY_BATCH_SIZE)
+        if not orders:
+            return 0, 0
+
+        now = datetime.utcnow()
+        sagas = {
+            saga["_id"]: saga
+            async for saga in db.db[SAGA_COLLECTION].find(
+                {"_id": {"$in": [order["_id"] for order in orders]}},
+                {"state": 1, "lease_until": 1, "payment_attempted": 1}
+            )
+        }
+        without_saga, claim, hand_off = [], [], []
+        for order in orders:
+            saga = sagas.get(order["_id"])
+            if saga is None:
+                without_saga.append(order["_id"])  # placed before sagas; nothing reserved
+            elif saga["state"] not in STUCK_STATES or saga["lease_until"] >= now:
+                skipped.append(order["_id"])
+            elif saga["payment_attempted"]:
+                hand_off.append(order["_id"])
+            else:
+                claim.append(order["_id"])
+        skipped.extend(hand_off)
+
+        batch_id = str(ObjectId())
+        stuck = {"state": {"$in": STUCK_STATES}, "lease_until": {"$lt": now}}
+
+        async def write(session):
+            if hand_off:
+                # The saga's own compensation refunds, releases and cancels
+                await db.db[SAGA_COLLECTION].update_many(
+                    {"_id": {"$in": hand_off}, **stuck},
+                    {"$set": {"state": COMPENSATING, "error": "expired", "updated_at": now}},
+                    session=session
+                )
+            claimed = []
+            if claim:
+                await db.db[SAGA_COLLECTION].update_many(
+                    {"_id": {"$in": claim}, "payment_attempted": False, **stuck},
+                    {"$set": {
+                        "state": EXPIRING,
+                        "owner": self.lease.owner,
+                        "expiry_batch": batch_id,
+                        "updated_at": now
+                    }},
+                    session=session
+                )
+                claimed = await db.db[SAGA_COLLECTION].find(
+                    {"expiry_batch": batch_id},
+                    {"_id": 1},
+                    session=session
+                ).to_list(length=None)
+
+            cancel = set(without_saga + [saga["_id"] for saga in claimed])
+            cancelled = await self._cancel(
+                batch_id, [order for order in orders if order["_id"] in cancel], now, session
+            )
+            return cancelled, claimed
+
+        cancelled, claimed = await run_in_transaction(write)
+        ORDERS_EXPIRED.inc(amount=len(cancelled))
+        if claimed:
+            await self._release(batch_id, claimed)
+        return len(orders), len(cancelled)
+
+    async def _cancel(self, batch_id: str, orders: List[dict], now: datetime, session) -> List[ObjectId]:
+        """Cancel the orders still PENDING, with their order.cancelled events."""
+        if not orders:
+            return []
+        await db.db.orders.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": order["_id"], "status": OrderStatus.PENDING},
+                    {"$set": {"status": OrderStatus.CANCELLED, "expiry_batch": batch_id, "updated_at": now}}
+                )
+                for order in orders
+            ],
+            ordered=False,
+            session=session
+        )
+        # Orders cancelled by their user since they were read kept their status
+        by_id = {order["_id"]: order for order in orders}
+        cancelled = [
+            order["_id"]
+            async for order in db.db.orders.find(
+                {"_id": {"$in": list(by_id)}, "expiry_batch": batch_id}, {"_id": 1}, session=session
+            )
+        ]
+        if cancelled:
+            await db.db[OUTBOX_COLLECTION].insert_many(
+                [
+                    new_event(
+                        "order.cancelled",
+                        order_id,
+                        {
+                            "order_id": str(order_id),
+                            "user_id": by_id[order_id]["user_id"],
+                            "reason": "expired",
+                            "items": by_id[order_id]["items"]
+                        }
+                    )
+                    for order_id in cancelled
+                ],
+                session=session
+            )
+        return cancelled
+
+    async def _release(self, batch_id: str, sagas: List[dict]) -> None:
+        # Inventory releases what it still holds for these orders, including
+        # reservations a dead saga made but never recorded in `reserved`
+        try:
+            response = await traced_request(
+                self._client,
+                "POST",
+                f"{settings.INVENTORY_SERVICE_URL}/api/v1/products/release-batch",
+                json={"batch_id": batch_id, "order_ids": [str(saga["_id"]) for saga in sagas]}
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            STOCK_RELEASE_BATCHES.inc("failed")
+            logger.warning(f"Stock release for expiry batch {batch_id} failed, will retry: {str(e)}")
+            return
+        STOCK_RELEASE_BATCHES.inc("released")
+
+        await db.db[SAGA_COLLECTION].update_many(
+            {"expiry_batch": batch_id, "state": EXPIRING},
+            {"$set": {"state": EXPIRED, "updated_at": datetime.utcnow()}}
+        )
+
+    async def _retry_pending_releases(self) -> int:
+        batches: Dict[str, List[dict]] = defaultdict(list)
+        async for saga in db.db[SAGA_COLLECTION].find(
+            {"state": EXPIRING},
+            {"expiry_batch": 1}
+        ):
+            batches[saga["expiry_batch"]].append(saga)
+        expired = 0
+        for batch_id, sagas in batches.items():
+            # Without transactions the run that claimed these sagas may have
+            # died before cancelling their orders; finish that first
+            orders = await db.db.orders.find(
+                {"_id": {"$in": [saga["_id"] for saga in sagas]}, "status": OrderStatus.PENDING},
+                {"user_id": 1, "items": 1}
+            ).to_list(length=None)
+            if orders:
+                now = datetime.utcnow()
+                cancelled = await run_in_transaction(
+                    lambda session: self._cancel(batch_id, orders, now, session)
+                )
+                ORDERS_EXPIRED.inc(amount=len(cancelled))
+                expired += len(cancelled)
+            await self._release(batch_id, sagas)
+        return expired
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await self.lease.acquire():
+                    await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Order expiry run failed: {str(e)}")
+            await asyncio.sleep(settings.ORDER_EXPIRY_INTERVAL_SECONDS)
+
+    async def start(self) -> None:
+        await db.db.orders.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+        await db.db[SAGA_COLLECTION].create_index("expiry_batch", sparse=True)
+        if not settings.ORDER_EXPIRY_ENABLED:
+            return
+        self._client = httpx.AsyncClient(timeout=settings.SAGA_STEP_TIMEOUT_SECONDS)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await self.lease.release()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+order_expiry = OrderExpiry()
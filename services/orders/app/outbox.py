@@ -0,0 +1,195 @@
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+import asyncio
+import logging
+import os
+import time
+
+from bson import ObjectId, json_util
+from pymongo import ASCENDING
+
+from app.config import settings
+from app.database import db
+from app.leader import LeaderLease
+from app.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_COLLECTION = "outbox"
+
+OUTBOX_EVENTS_PUBLISHED = Counter("outbox_events_published_total", "Outbox events handed to the broker", ("type",))
+OUTBOX_RELAY_ERRORS = Counter("outbox_relay_errors_total", "Failed outbox relay batches")
+OUTBOX_RELAY_LAG = Gauge("outbox_relay_lag_seconds", "Age of the newest event in the last published batch")
+
+T = TypeVar("T")
+
+def new_event(event_type: str, aggregate_id: Any, payload: Dict[str, Any]) -> dict:
+    return {
+        "_id": ObjectId(),
+        "type": event_type,
+        "service": settings.SERVICE_NAME,
+        "aggregate_id": str(aggregate_id),
+        "payload": payload,
+        "created_at": datetime.utcnow(),
+        "published_at": None
+    }
+
+async def record_event(event_type: str, aggregate_id: Any, payload: Dict[str, Any], session=None) -> None:
+    """Insert a domain event; pass the state change's session so both commit together."""
+    await db.db[OUTBOX_COLLECTION].insert_one(new_event(event_type, aggregate_id, payload), session=session)
+
+class _TransactionSupport:
+    enabled = False
+
+transactions = _TransactionSupport()
+
+async def run_in_transaction(callback: Callable[[Any], Awaitable[T]]) -> T:
+    """
+    Run `callback(session)` in a MongoDB transaction, retried on transient
+    errors. Without transaction support (standalone mongod, mongomock) the
+    callback gets no session and its writes are applied one by one.
+    """
+    if not transactions.enabled:
+        return await callback(None)
+    async with await db.client.start_session() as session:
+        return await session.with_transaction(callback)
+
+async def setup_outbox() -> None:
+    # Events only need to outlive the relay; the TTL also bounds the outbox
+    # when no relay is running
+    await db.db[OUTBOX_COLLECTION].create_index(
+        [("created_at", ASCENDING)],
+        expireAfterSeconds=int(settings.OUTBOX_RETENTION_HOURS * 3600)
+    )
+    await db.db[OUTBOX_COLLECTION].create_index([("published_at", ASCENDING), ("_id", ASCENDING)])
+
+    if settings.OUTBOX_TRANSACTIONS is not None:
+        transactions.enabled = settings.OUTBOX_TRANSACTIONS
+    else:
+        # Transactions need a replica set member or mongos
+        try:
+            hello = await db.client.admin.command("hello")
+            transactions.enabled = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception as e:
+            logger.warning(f"Could not detect transaction support: {str(e)}")
+            transactions.enabled = False
+    if not transactions.enabled:
+        logger.warning("MongoDB transactions unavailable; outbox events are written after their state change")
+
+class Broker:
+    """Where relayed events go. `publish` must not return before the batch is durable."""
+
+    async def publish(self, events: List[dict]) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+class InProcessBroker(Broker):
+    """Delivers batches to handlers in this process; for tests and local consumers."""
+
+    def __init__(self):
+        self._handlers: List[Callable[[List[dict]], Awaitable[None]]] = []
+
+    def subscribe(self, handler: Callable[[List[dict]], Awaitable[None]]) -> None:
+        self._handlers.append(handler)
+
+    async def publish(self, events):
+        for handler in self._handlers:
+            await handler(events)
+
+class FileBroker(Broker):
+    """Appends events as extended-JSON lines, fsynced per batch."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _append(self, lines: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def publish(self, events):
+        lines = "".join(json_util.dumps(event) + "\n" for event in events)
+        await asyncio.to_thread(self._append, lines)
+
+def create_broker() -> Optional[Broker]:
+    if settings.OUTBOX_BROKER == "file":
+        return FileBroker(settings.OUTBOX_FILE_PATH)
+    if settings.OUTBOX_BROKER == "memory":
+        return InProcessBroker()
+    return None
+
+class OutboxRelay:
+    """
+    Publishes unpublished outbox events in batches and marks them
+    `published_at` once the broker accepts them, so delivery is
+    at-least-once: a crash between the two republishes the batch, and
+    consumers dedupe on the event `_id`. An event is picked up whenever its
+    write commits, however late; `_id` order is followed only loosely.
+
+    Only the worker holding the "<service>-outbox" leader lease relays, so
+    every uvicorn worker and replica can leave OUTBOX_RELAY_ENABLED on.
+    """
+
+    def __init__(self, broker: Optional[Broker]):
+        self.broker = broker
+        self.lease = LeaderLease(f"{settings.SERVICE_NAME}-outbox", settings.OUTBOX_RELAY_LEASE_SECONDS)
+        self._task: Optional[asyncio.Task] = None
+
+    async def relay_once(self) -> int:
+        """Publish one batch; returns the number of events published."""
+        cursor = db.db[OUTBOX_COLLECTION].find({"published_at": None}).sort(
+            "_id", ASCENDING
+        ).limit(settings.OUTBOX_BATCH_SIZE)
+        events = await cursor.to_list(length=settings.OUTBOX_BATCH_SIZE)
+        if not events:
+            return 0
+
+        await self.broker.publish(events)
+
+        now = datetime.utcnow()
+        await db.db[OUTBOX_COLLECTION].update_many(
+            {"_id": {"$in": [event["_id"] for event in events]}},
+            {"$set": {"published_at": now}}
+        )
+        for event in events:
+            OUTBOX_EVENTS_PUBLISHED.inc(event["type"])
+        OUTBOX_RELAY_LAG.set((now - max(event["created_at"] for event in events)).total_seconds())
+        return len(events)
+
+    async def _run(self) -> None:
+        renew_at = 0.0
+        while True:
+            try:
+                # Renew well before the lease runs out rather than on every poll
+                if time.monotonic() >= renew_at:
+                    await self.lease.acquire()
+                    renew_at = time.monotonic() + settings.OUTBOX_RELAY_LEASE_SECONDS / 3
+                published = await self.relay_once() if self.lease.is_leader else 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                OUTBOX_RELAY_ERRORS.inc()
+                logger.error(f"Outbox relay batch failed: {str(e)}")
+                published = 0
+            if not self.lease.is_leader:
+                await asyncio.sleep(settings.OUTBOX_RELAY_LEASE_SECONDS / 3)
+            elif published < settings.OUTBOX_BATCH_SIZE:
+                await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL_MS / 1000)
+
+    def start(self) -> None:
+        if settings.OUTBOX_RELAY_ENABLED and self.broker is not None and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await self.lease.release()
+        if self.broker is not None:
+            await self.broker.close()
+
+outbox_relay = OutboxRelay(create_broker())
@@ -1,10 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List
 import logging
 
-from app.models import OrderCreate, Order, OrderUpdate, OrderStatus
+from app.models import OrderCreate, Order, OrderUpdate, OrderStatus, ORDER_LIST_ADAPTER
 from app.database import get_database
+from app.loader import DocumentLoader
+from app.outbox import record_event, run_in_transaction
+from app.saga import SAGA_COLLECTION, checkout_saga
+from app.serialization import serialize
+from app.etag import (
+    ETAG_PROJECTION,
+    PRIVATE_CACHE_CONTROL,
+    compute_etag,
+    is_conditional,
+    etag_matches,
+    not_modified,
+    set_cache_headers
+)
 from bson import ObjectId
 from datetime import datetime
 
@@ -12,6 +25,9 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 security = HTTPBearer()
 
+# Concurrent order reads are resolved with one $in query per window
+order_loader = DocumentLoader("orders", lambda: get_database().orders)
+
 # Simple auth - in production, verify JWT token
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security)
@@ -44,23 +60,32 @@ async def create_order(
         "updated_at": datetime.utcnow()
     }
     
-    result = await db.orders.insert_one(order_dict)
-    created_order = await db.orders.find_one({"_id": result.inserted_id})
-    
-    logger.info(f"Order created: {result.inserted_id} for user {user_id}")
-    
-    return Order(
-        id=str(created_order["_id"]),
-        user_id=created_order["user_id"],
-        items=[OrderItem(**item) for item in created_order["items"]],
-        shipping_address=ShippingAddress(**created_order["shipping_address"]),
-        payment_method=created_order["payment_method"],
-        status=created_order["status"],
-        total_amount=created_order["total_amount"],
-        tracking_number=created_order.get("tracking_number"),
-        created_at=created_order["created_at"],
-        updated_at=created_order["updated_at"]
-    )
+    async def write(session):
+        result = await db.orders.insert_one(order_dict, session=session)
+        await record_event(
+            "order.created",
+            result.inserted_id,
+            {
+                "order_id": str(result.inserted_id),
+                "user_id": user_id,
+                "items": order_dict["items"],
+                "total_amount": total_amount
+            },
+            session=session
+        )
+        await db[SAGA_COLLECTION].insert_one(checkout_saga.new_saga(result.inserted_id), session=session)
+        return result.inserted_id
+    
+    order_id = await run_in_transaction(write)
+    created_order = await db.orders.find_one({"_id": order_id})
+    
+    # Stock and payment are settled in the background; the order stays
+    # PENDING until the saga confirms or cancels it
+    checkout_saga.launch(order_id)
+    
+    logger.info(f"Order created: {order_id} for user {user_id}")
+    
+    return created_order
 
 @router.get("/orders", response_model=List[Order])
 async def list_orders(current_user: dict = Depends(get_current_user)):
@@ -70,25 +95,13 @@ async def list_orders(current_user: dict = Depends(get_current_user)):
     cursor = db.orders.find({"user_id": user_id}).sort("created_at", -1)
     orders = await cursor.to_list(length=100)
     
-    return [
-        Order(
-            id=str(o["_id"]),
-            user_id=o["user_id"],
-            items=[OrderItem(**item) for item in o["items"]],
-            shipping_address=ShippingAddress(**o["shipping_address"]),
-            payment_method=o["payment_method"],
-            status=o["status"],
-            total_amount=o["total_amount"],
-            tracking_number=o.get("tracking_number"),
-            created_at=o["created_at"],
-            updated_at=o["updated_at"]
-        )
-        for o in orders
-    ]
+    return serialize(ORDER_LIST_ADAPTER, orders)
 
 @router.get("/orders/{order_id}", response_model=Order)
 async def get_order(
     order_id: str,
+    request: Request,
+    response: Response,
     current_user: dict = Depends(get_current_user)
 ):
     db = get_database()
@@ -96,7 +109,21 @@ async def get_order(
     if not ObjectId.is_valid(order_id):
         raise HTTPException(status_code=400, detail="Invalid order ID")
     
-    order = await db.orders.find_one({"_id": ObjectId(order_id)})
+    # Revalidate against the timestamps only, skipping the full document
+    if is_conditional(request):
+        stamp = await db.orders.find_one(
+            {"_id": ObjectId(order_id)},
+            {**ETAG_PROJECTION, "user_id": 1}
+        )
+        if not stamp:
+            raise HTTPException(status_code=404, detail="Order not found")
+        if stamp["user_id"] != current_user["sub"]:
+            raise HTTPException(status_code=403, detail="Access denied")
+        etag = compute_etag(stamp)
+        if etag_matches(request, etag):
+            return not_modified(etag, PRIVATE_CACHE_CONTROL)
+    
+    order = await order_loader.load(ObjectId(order_id))
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -105,18 +132,9 @@ async def get_order(
     if order["user_id"] != current_user["sub"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    return Order(
-        id=str(order["_id"]),
-        user_id=order["user_id"],
-        items=[OrderItem(**item) for item in order["items"]],
-        shipping_address=ShippingAddress(**order["shipping_address"]),
-        payment_method=order["payment_method"],
-        status=order["status"],
-        total_amount=order["total_amount"],
-        tracking_number=order.get("tracking_number"),
-        created_at=order["created_at"],
-        updated_at=order["updated_at"]
-    )
+    set_cache_headers(response, compute_etag(order), PRIVATE_CACHE_CONTROL)
+    
+    return order
 
 @router.put("/orders/{order_id}", response_model=Order)
 async def update_order(
@@ -148,18 +166,7 @@ async def update_order(
     
     updated_order = await db.orders.find_one({"_id": ObjectId(order_id)})
     
-    return Order(
-        id=str(updated_order["_id"]),
-        user_id=updated_order["user_id"],
-        items=[OrderItem(**item) for item in updated_order["items"]],
-        shipping_address=ShippingAddress(**updated_order["shipping_address"]),
-        payment_method=updated_order["payment_method"],
-        status=updated_order["status"],
-        total_amount=updated_order["total_amount"],
-        tracking_number=updated_order.get("tracking_number"),
-        created_at=updated_order["created_at"],
-        updated_at=updated_order["updated_at"]
-    )
+    return updated_order
 
 @router.post("/orders/{order_id}/cancel")
 async def cancel_order(
@@ -185,10 +192,34 @@ async def cancel_order(
             detail="Order cannot be cancelled at this stage"
         )
     
-    await db.orders.update_one(
-        {"_id": ObjectId(order_id)},
-        {"$set": {"status": OrderStatus.CANCELLED, "updated_at": datetime.utcnow()}}
-    )
+    async def write(session):
+        # Guarded: the saga or the expiry job may have moved the order on since the read
+        previous = await db.orders.find_one_and_update(
+            {"_id": ObjectId(order_id), "status": {"$in": [OrderStatus.PENDING, OrderStatus.CONFIRMED]}},
+            {"$set": {"status": OrderStatus.CANCELLED, "updated_at": datetime.utcnow()}},
+            projection={"status": 1},
+            session=session
+        )
+        if previous is None:
+            raise HTTPException(
+                status_code=409,
+                detail="Order cannot be cancelled at this stage"
+            )
+        await record_event(
+            "order.cancelled",
+            order_id,
+            {
+                "order_id": order_id,
+                "user_id": order["user_id"],
+                "previous_status": previous["status"],
+                "items": order["items"]
+            },
+            session=session
+        )
+    
+    await run_in_transaction(write)
+    # Refund and release stock if checkout already completed
+    await checkout_saga.order_cancelled(ObjectId(order_id))
     
     logger.info(f"Order cancelled: {order_id}")
     
@@ -0,0 +1,417 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+import asyncio
+import contextvars
+import logging
+import os
+import socket
+import time
+import uuid
+
+import httpx
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+
+from app.config import settings
+from app.database import db
+from app.metrics import Counter, Gauge, Histogram
+from app.middleware import correlation_id_var
+from app.models import OrderStatus
+from app.outbox import record_event, run_in_transaction
+from app.tracing import current_span, traced_request
+
+logger = logging.getLogger(__name__)
+
+SAGA_COLLECTION = "sagas"
+
+# Saga states; the first four are resumed by whichever replica holds the lease
+RESERVING = "reserving"
+PAYING = "paying"
+CONFIRMING = "confirming"
+COMPENSATING = "compensating"
+COMPLETED = "completed"
+COMPENSATED = "compensated"
+ACTIVE_STATES = [RESERVING, PAYING, CONFIRMING, COMPENSATING]
+
+SAGA_STARTED = Counter("saga_started_total", "Checkout sagas started")
+SAGA_FINISHED = Counter("saga_finished_total", "Checkout sagas finished", ("outcome",))
+SAGA_STEP_DURATION = Histogram("saga_step_duration_seconds", "Checkout saga step duration", ("step",))
+SAGA_IN_FLIGHT = Gauge("saga_in_flight", "Checkout sagas being driven by this worker")
+
+class StepFailed(Exception):
+    """A step that cannot succeed (rejected by the other service); the saga compensates."""
+
+class ServiceUnavailable(Exception):
+    """Another service kept failing or timing out after SAGA_MAX_ATTEMPTS."""
+
+class LeaseLost(Exception):
+    """Another worker took the saga over; stop driving it."""
+
+class PaymentPending(Exception):
+    """The order's payment is still processing; the saga is resumed later."""
+
+class CheckoutSaga:
+    """
+    Drives an order from PENDING to CONFIRMED: reserve stock for each item,
+    take payment, then confirm the order. If a step is rejected, or the order
+    is cancelled meanwhile, completed steps are undone in reverse (refund,
+    release) and the order is cancelled.
+
+    Saga state lives in the `sagas` collection, keyed by order id, and is
+    written after every remote call, so a saga survives the worker that
+    started it: each transition renews a lease, and the recovery loop
+    resumes sagas whose lease has expired. Remote calls are retried and may
+    repeat after a crash between the call and the state write, so steps are
+    at-least-once: inventory keeps one reservation per (order, product) and
+    payments one payment per order, so a repeated call is acknowledged
+    rather than applied twice.
+    """
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Overridable in benchmarks to route calls to local fakes
+        self.transport: Optional[httpx.AsyncBaseTransport] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._running: Dict[ObjectId, asyncio.Task] = {}
+        self._recovery: Optional[asyncio.Task] = None
+
+    def new_saga(self, order_id: ObjectId) -> dict:
+        SAGA_STARTED.inc()
+        now = datetime.utcnow()
+        return {
+            "_id": order_id,
+            "state": RESERVING,
+            "reserved": [],
+            "released": 0,
+            "payment_attempted": False,
+            "payment_id": None,
+            "error": None,
+            "owner": self.owner,
+            "lease_until": now + timedelta(seconds=settings.SAGA_LEASE_SECONDS),
+            "created_at": now,
+            "updated_at": now
+        }
+
+    def launch(self, order_id: ObjectId) -> None:
+        if order_id in self._running:
+            return
+        # A fresh context: the request's DB accounting must not pick up saga
+        # queries, but the correlation ID and trace carry over
+        context = contextvars.Context()
+        context.run(correlation_id_var.set, correlation_id_var.get())
+        context.run(current_span.set, current_span.get())
+        task = asyncio.get_running_loop().create_task(self._run(order_id), context=context)
+        self._running[order_id] = task
+        task.add_done_callback(lambda done: self._running.pop(order_id, None))
+
+    async def order_cancelled(self, order_id: ObjectId) -> None:
+        """Undo a completed checkout; sagas still running notice the cancellation themselves."""
+        saga = await db.db[SAGA_COLLECTION].find_one_and_update(
+            {"_id": order_id, "state": COMPLETED},
+            {"$set": {
+                "state": COMPENSATING,
+                "error": "order cancelled",
+                "owner": self.owner,
+                "lease_until": datetime.utcnow() + timedelta(seconds=settings.SAGA_LEASE_SECONDS),
+                "updated_at": datetime.utcnow()
+            }}
+        )
+        if saga:
+            self.launch(order_id)
+
+    async def _run(self, order_id: ObjectId) -> None:
+        if correlation_id_var.get() == "unknown":
+            correlation_id_var.set(f"saga-{order_id}")
+        async with self._semaphore:
+            saga = await self._claim(order_id)
+            if saga is None:
+                return
+            SAGA_IN_FLIGHT.inc()
+            try:
+                await self._drive(saga)
+            except LeaseLost:
+                logger.info(f"Saga {order_id} taken over by another worker")
+            except PaymentPending as e:
+                # Neither charged nor failed yet: retried once the lease expires
+                logger.warning(f"Saga {order_id} waiting in state {saga['state']}: {str(e)}")
+            except Exception as e:
+                # The lease runs out and the recovery loop retries from the saved state
+                logger.error(f"Saga {order_id} stopped in state {saga['state']}: {str(e)}")
+            finally:
+                SAGA_IN_FLIGHT.dec()
+
+    async def _claim(self, order_id: ObjectId) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await db.db[SAGA_COLLECTION].find_one_and_update(
+            {
+                "_id": order_id,
+                "state": {"$in": ACTIVE_STATES},
+                "$or": [{"owner": self.owner}, {"lease_until": {"$lt": now}}]
+            },
+            {"$set": {"owner": self.owner, "lease_until": now + timedelta(seconds=settings.SAGA_LEASE_SECONDS)}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _update(self, saga: dict, update: Dict[str, Any], session=None) -> None:
+        """Apply `update` if this worker still owns the saga in its current state."""
+        now = datetime.utcnow()
+        update.setdefault("$set", {}).update({
+            "updated_at": now,
+            "lease_until": now + timedelta(seconds=settings.SAGA_LEASE_SECONDS)
+        })
+        result = await db.db[SAGA_COLLECTION].update_one(
+            {"_id": saga["_id"], "state": saga["state"], "owner": self.owner},
+            update,
+            session=session
+        )
+        if result.matched_count == 0:
+            raise LeaseLost()
+
+    async def _transition(self, saga: dict, state: str, session=None, **fields) -> None:
+        await self._update(saga, {"$set": {"state": state, **fields}}, session=session)
+        saga.update(state=state, **fields)
+
+    async def _drive(self, saga: dict) -> None:
+        order = await db.db.orders.find_one({"_id": saga["_id"]})
+        while saga["state"] in ACTIVE_STATES:
+            step = saga["state"]
+            start = time.perf_counter()
+            try:
+                if order is None and step != COMPENSATING:
+                    raise StepFailed("order not found")
+                if step == RESERVING:
+                    await self._reserve(saga, order)
+                    await self._transition(saga, PAYING)
+                elif step == PAYING:
+                    payment_id = await self._pay(saga, order)
+                    await self._transition(saga, CONFIRMING, payment_id=payment_id)
+                elif step == CONFIRMING:
+                    await self._confirm(saga)
+                else:
+                    await self._compensate(saga, order)
+            except (StepFailed, ServiceUnavailable) as e:
+                if step == COMPENSATING:
+                    raise
+                logger.warning(f"Saga {saga['_id']} failed at {step}: {str(e)}")
+                await self._transition(saga, COMPENSATING, error=f"{step}: {str(e)}")
+            finally:
+                SAGA_STEP_DURATION.observe(time.perf_counter() - start, step)
+        SAGA_FINISHED.inc(saga["state"])
+
+    async def _call(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Call another service, retrying transport errors and 5xx responses.
+        4xx responses are returned to the caller to interpret.
+        """
+        for attempt in range(1, settings.SAGA_MAX_ATTEMPTS + 1):
+            try:
+                response = await traced_request(self._client, method, url, **kwargs)
+                if response.status_code < 500:
+                    return response
+                error = f"{response.status_code} from {url}"
+            except httpx.HTTPError as e:
+                error = f"{type(e).__name__} calling {url}"
+            if attempt < settings.SAGA_MAX_ATTEMPTS:
+                await asyncio.sleep(settings.SAGA_RETRY_BACKOFF_MS / 1000 * 2 ** (attempt - 1))
+        raise ServiceUnavailable(error)
+
+    async def _reserve(self, saga: dict, order: dict) -> None:
+        # Items are reserved in order; `reserved` records how far we got
+        for item in order["items"][len(saga["reserved"]):]:
+            product_id = item["product_id"]
+            response = await self._call(
+                "POST",
+                f"{settings.INVENTORY_SERVICE_URL}/api/v1/products/{product_id}/reserve",
+                json={"product_id": product_id, "quantity": item["quantity"], "order_id": str(saga["_id"])}
+            )
+            if response.status_code != 200:
+                raise StepFailed(f"reserve {product_id}: {_detail(response)}")
+            entry = {"product_id": product_id, "quantity": item["quantity"]}
+            await self._update(saga, {"$push": {"reserved": entry}})
+            saga["reserved"].append(entry)
+
+    async def _pay(self, saga: dict, order: dict) -> str:
+        current = await db.db.orders.find_one({"_id": saga["_id"]}, {"status": 1})
+        if current is None or current["status"] != OrderStatus.PENDING:
+            raise StepFailed("order no longer pending")
+
+        if not saga["payment_attempted"]:
+            await self._update(saga, {"$set": {"payment_attempted": True}})
+            saga["payment_attempted"] = True
+
+        # Payments are unique per order: an earlier attempt that charged comes back with 200
+        response = await self._call(
+            "POST",
+            f"{settings.PAYMENTS_SERVICE_URL}/api/v1/payments",
+            json={
+                "order_id": str(saga["_id"]),
+                "amount": order["total_amount"],
+                "currency": "USD",
+                "payment_method": order["payment_method"]
+            }
+        )
+        if response.status_code not in (200, 201):
+            raise StepFailed(f"payment: {_detail(response)}")
+        return self._payment_id(await self._settled(saga, response.json()))
+
+    def _payment_id(self, payment: dict) -> str:
+        if payment["status"] != "completed":
+            raise StepFailed(f"payment {payment['id']} is {payment['status']}")
+        return payment["id"]
+
+    async def _settled(self, saga: dict, payment: Optional[dict]) -> Optional[dict]:
+        """
+        Wait for a payment another attempt is still processing (a retry after
+        a timeout gets it back with 200): compensating now would skip the
+        refund of a charge that completes moments later.
+        """
+        attempt = 0
+        while payment is not None and payment["status"] in ("pending", "processing"):
+            if attempt == settings.SAGA_MAX_ATTEMPTS:
+                raise PaymentPending(f"payment {payment['id']} is still {payment['status']}")
+            await asyncio.sleep(settings.SAGA_RETRY_BACKOFF_MS / 1000 * 2 ** attempt)
+            payment = await self._find_payment(saga)
+            attempt += 1
+        return payment
+
+    async def _find_payment(self, saga: dict) -> Optional[dict]:
+        # Bypass the payment status cache, which may still hold "no payment"
+        response = await self._call(
+            "GET",
+            f"{settings.PAYMENTS_SERVICE_URL}/api/v1/payments/order/{saga['_id']}",
+            headers={"Cache-Control": "no-cache"}
+        )
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise ServiceUnavailable(f"payment lookup: {_detail(response)}")
+        return response.json()
+
+    async def _confirm(self, saga: dict) -> None:
+        async def write(session):
+            result = await db.db.orders.update_one(
+                {"_id": saga["_id"], "status": OrderStatus.PENDING},
+                {"$set": {"status": OrderStatus.CONFIRMED, "updated_at": datetime.utcnow()}},
+                session=session
+            )
+            if result.modified_count == 0:
+                raise StepFailed("order no longer pending")
+            await record_event(
+                "order.confirmed",
+                saga["_id"],
+                {"order_id": str(saga["_id"]), "payment_id": saga["payment_id"]},
+                session=session
+            )
+            await self._update(saga, {"$set": {"state": COMPLETED}}, session=session)
+
+        await run_in_transaction(write)
+        saga["state"] = COMPLETED
+
+    async def _compensate(self, saga: dict, order: Optional[dict]) -> None:
+        payment_id = saga["payment_id"]
+        if payment_id is None and saga["payment_attempted"]:
+            payment = await self._settled(saga, await self._find_payment(saga))
+            if payment is not None and payment["status"] == "completed":
+                payment_id = payment["id"]
+        if payment_id is not None:
+            response = await self._call(
+                "POST",
+                f"{settings.PAYMENTS_SERVICE_URL}/api/v1/payments/refund",
+                json={"payment_id": payment_id, "reason": saga["error"]}
+            )
+            # 409: already refunded by an earlier attempt
+            if response.status_code not in (200, 409):
+                raise ServiceUnavailable(f"refund {payment_id}: {_detail(response)}")
+
+        # Release in reverse; `released` records how many are done
+        reserved = saga["reserved"]
+        for index in range(len(reserved) - 1 - saga["released"], -1, -1):
+            entry = reserved[index]
+            response = await self._call(
+                "POST",
+                f"{settings.INVENTORY_SERVICE_URL}/api/v1/products/{entry['product_id']}/release",
+                json={**entry, "order_id": str(saga["_id"])}
+            )
+            if response.status_code != 200:
+                raise ServiceUnavailable(f"release {entry['product_id']}: {_detail(response)}")
+            await self._update(saga, {"$inc": {"released": 1}})
+            saga["released"] += 1
+
+        async def write(session):
+            if order is not None:
+                result = await db.db.orders.update_one(
+                    {"_id": saga["_id"], "status": {"$in": [OrderStatus.PENDING, OrderStatus.CONFIRMED]}},
+                    {"$set": {"status": OrderStatus.CANCELLED, "updated_at": datetime.utcnow()}},
+                    session=session
+                )
+                if result.modified_count:
+                    await record_event(
+                        "order.cancelled",
+                        saga["_id"],
+                        {
+                            "order_id": str(saga["_id"]),
+                            "user_id": order["user_id"],
+                            "reason": saga["error"],
+                            "items": order["items"]
+                        },
+                        session=session
+                    )
+            await self._update(saga, {"$set": {"state": COMPENSATED}}, session=session)
+
+        await run_in_transaction(write)
+        saga["state"] = COMPENSATED
+
+    async def _recover(self) -> None:
+        while True:
+            await asyncio.sleep(settings.SAGA_RECOVERY_INTERVAL_SECONDS)
+            try:
+                cursor = db.db[SAGA_COLLECTION].find(
+                    {"state": {"$in": ACTIVE_STATES}, "lease_until": {"$lt": datetime.utcnow()}},
+                    {"_id": 1}
+                ).limit(settings.SAGA_CONCURRENCY)
+                async for saga in cursor:
+                    self.launch(saga["_id"])
+            except Exception as e:
+                logger.error(f"Saga recovery scan failed: {str(e)}")
+
+    async def start(self) -> None:
+        await db.db[SAGA_COLLECTION].create_index([("state", ASCENDING), ("lease_until", ASCENDING)])
+        self._semaphore = asyncio.Semaphore(settings.SAGA_CONCURRENCY)
+        self._client = httpx.AsyncClient(
+            transport=self.transport,
+            timeout=settings.SAGA_STEP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=settings.SAGA_MAX_CONNECTIONS)
+        )
+        self._recovery = asyncio.create_task(self._recover())
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """Wait for sagas running in this worker to finish (benchmarks, tests)."""
+        deadline = time.monotonic() + timeout if timeout else None
+        while self._running:
+            remaining = deadline - time.monotonic() if deadline else None
+            if remaining is not None and remaining <= 0:
+                return
+            await asyncio.wait(list(self._running.values()), timeout=remaining)
+
+    async def stop(self) -> None:
+        # Interrupted sagas keep their saved state and are resumed after their lease expires
+        tasks = [task for task in [self._recovery, *self._running.values()] if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._recovery = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+def _detail(response: httpx.Response) -> str:
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    if isinstance(body, dict) and "detail" in body:
+        return str(body["detail"])
+    return str(response.status_code)
+
+checkout_saga = CheckoutSaga()
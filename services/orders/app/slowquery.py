@@ -0,0 +1,202 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+import asyncio
+import json
+import logging
+import threading
+
+from pymongo import monitoring
+
+from app.config import settings
+from app.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERIES = Counter(
+    "mongodb_slow_queries_total", "Commands slower than SLOW_QUERY_THRESHOLD_MS", ("command", "collection")
+)
+
+# Commands whose shape is worth recording, and the field holding their filter
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+    "update": "updates",
+    "delete": "deletes",
+}
+
+# Session/transport fields that explain rejects or that vary per call
+_DRIVER_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+def query_shape(value: Any) -> Any:
+    """Strip values from a filter, keeping field names and operators."""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [query_shape(item) for item in value]
+        # $in lists and other literal arrays collapse to one placeholder
+        return "?"
+    return "?"
+
+def command_shape(command_name: str, command: dict) -> Any:
+    field = FILTER_FIELDS[command_name]
+    if command_name in ("update", "delete"):
+        return [query_shape(statement.get("q", {})) for statement in command.get(field, [])[:1]]
+    return query_shape(command.get(field, {}))
+
+def summarize_plan(explain: dict) -> Dict[str, Any]:
+    """Stage names and indexes of the winning plan(s) in an explain result."""
+    stages: List[str] = []
+    indexes: List[str] = []
+
+    def walk(node: Any, in_plan: bool) -> None:
+        if isinstance(node, dict):
+            if in_plan and "stage" in node:
+                stages.append(node["stage"])
+                if "indexName" in node:
+                    indexes.append(node["indexName"])
+            for key, child in node.items():
+                walk(child, in_plan or key == "winningPlan")
+        elif isinstance(node, list):
+            for child in node:
+                walk(child, in_plan)
+
+    walk(explain, False)
+    return {"stages": stages, "indexes": indexes, "collscan": "COLLSCAN" in stages}
+
+class SlowQueryRecorder:
+    """
+    Bounded table of slow command shapes, ordered by cumulative time.
+
+    Commands are fed from the listener on driver threads; the first time a
+    shape is seen, `explain` (queryPlanner verbosity) runs once on the event
+    loop and its plan summary is attached to the entry.
+    """
+
+    def __init__(self, max_shapes: int):
+        self.max_shapes = max_shapes
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self) -> None:
+        self._loop = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def record(self, database: str, command_name: str, command: dict, duration_ms: float) -> None:
+        collection = command.get(command_name)
+        if not isinstance(collection, str):
+            return
+        shape = command_shape(command_name, command)
+        sort = command.get("sort")
+        key = json.dumps(
+            [database, collection, command_name, shape, sort],
+            sort_keys=True,
+            default=str
+        )
+        SLOW_QUERIES.inc(command_name, collection)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            is_new = entry is None
+            if is_new:
+                if len(self._entries) >= self.max_shapes:
+                    # Evict the shape contributing least to total time
+                    coldest = min(self._entries, key=lambda k: self._entries[k]["total_ms"])
+                    del self._entries[coldest]
+                entry = self._entries[key] = {
+                    "database": database,
+                    "collection": collection,
+                    "command": command_name,
+                    "shape": shape,
+                    "sort": sort,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "first_seen": datetime.utcnow().isoformat(),
+                    "plan": None,
+                }
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["last_seen"] = datetime.utcnow().isoformat()
+
+        if is_new and settings.SLOW_QUERY_EXPLAIN and self._loop is not None:
+            explainable = {
+                name: value for name, value in command.items()
+                if not name.startswith("$") and name not in _DRIVER_FIELDS
+            }
+            self._loop.call_soon_threadsafe(self._schedule_explain, key, database, explainable)
+
+    def _schedule_explain(self, key: str, database: str, command: dict) -> None:
+        task = asyncio.ensure_future(self._explain(key, database, command))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(self, key: str, database: str, command: dict) -> None:
+        from app.database import db
+
+        try:
+            result = await db.client[database].command(
+                {"explain": command, "verbosity": "queryPlanner"}
+            )
+        except Exception as e:
+            logger.warning(f"Explain failed for slow query shape: {str(e)}")
+            return
+        plan = summarize_plan(result)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry["plan"] = plan
+        if plan["collscan"]:
+            logger.warning(
+                f"Slow query uses COLLSCAN: {entry['command']} on "
+                f"{entry['database']}.{entry['collection']} with {json.dumps(entry['shape'])}"
+            )
+
+    def top(self, limit: int) -> List[dict]:
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda e: e["total_ms"], reverse=True)
+            return [
+                {**entry, "avg_ms": round(entry["total_ms"] / entry["count"], 2)}
+                for entry in entries[:limit]
+            ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+slow_queries = SlowQueryRecorder(settings.SLOW_QUERY_MAX_SHAPES)
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Feeds commands slower than SLOW_QUERY_THRESHOLD_MS to the recorder."""
+
+    def __init__(self, recorder: SlowQueryRecorder = slow_queries):
+        self.recorder = recorder
+        self._commands: Dict[tuple, tuple] = {}
+
+    def started(self, event):
+        if event.command_name in FILTER_FIELDS:
+            self._commands[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+
+    def succeeded(self, event):
+        started = self._commands.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS:
+            database, command = started
+            self.recorder.record(database, event.command_name, command, duration_ms)
+
+    def failed(self, event):
+        self._commands.pop((event.connection_id, event.request_id), None)
@@ -0,0 +1,175 @@
+"""
+Fixtures for the orders tests: an in-memory MongoDB (mongomock-motor)
+behind app.database, and fake inventory and payments services that the
+saga and the expiry job call through httpx's ASGI transport.
+
+Run from services/orders with pytest, pytest-asyncio and mongomock-motor
+installed:
+
+    python -m pytest -q tests
+"""
+import os
+
+os.environ.update({
+    "LOG_LEVEL": "ERROR",
+    "SAGA_RETRY_BACKOFF_MS": "1",
+    "SAGA_RECOVERY_INTERVAL_SECONDS": "3600",
+})
+
+from collections import defaultdict
+from datetime import datetime
+
+import httpx
+import mongomock.collection
+import pytest
+import pytest_asyncio
+from bson import ObjectId
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from mongomock_motor import AsyncMongoMockClient
+
+from app.database import db
+from app.models import OrderStatus
+from app.saga import SAGA_COLLECTION, CheckoutSaga
+
+# pymongo 4.9+ passes `sort` to the bulk builder, which mongomock predates
+_add_update = mongomock.collection.BulkOperationBuilder.add_update
+mongomock.collection.BulkOperationBuilder.add_update = (
+    lambda self, *args, sort=None, **kwargs: _add_update(self, *args, **kwargs)
+)
+
+class FakeServices:
+    """
+    Inventory and payments as the saga sees them: one reservation per
+    (order, product), one payment per order. `fail_next[name]` makes the
+    next calls to that endpoint answer 500 after applying the change, like
+    a timeout that hides a success. `processing_polls` keeps new payments
+    "processing" for that many lookups, like a charge still in flight.
+    """
+
+    def __init__(self):
+        self.stock: dict = {}
+        self.reservations: dict = {}
+        self.payments: dict = {}
+        self.refunds: list = []
+        self.batches: dict = {}
+        self.fail_next = defaultdict(int)
+        self.processing_polls = 0
+        self.app = self._build()
+
+    def _fail(self, name: str) -> bool:
+        if self.fail_next[name]:
+            self.fail_next[name] -= 1
+            return True
+        return False
+
+    def reserved(self, product_id: str) -> int:
+        return sum(q for (_, p), q in self.reservations.items() if p == product_id)
+
+    def _build(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/api/v1/products/{product_id}/reserve")
+        async def reserve(product_id: str, body: dict):
+            key = (body["order_id"], product_id)
+            if key not in self.reservations:
+                if self.stock.get(product_id, 0) - self.reserved(product_id) < body["quantity"]:
+                    return JSONResponse({"detail": "Insufficient stock"}, status_code=400)
+                self.reservations[key] = body["quantity"]
+            if self._fail("reserve"):
+                return JSONResponse({"detail": "Internal Server Error"}, status_code=500)
+            return {"message": "Stock reserved successfully"}
+
+        @app.post("/api/v1/products/{product_id}/release")
+        async def release(product_id: str, body: dict):
+            self.reservations.pop((body["order_id"], product_id), None)
+            return {"message": "Stock released successfully"}
+
+        @app.post("/api/v1/products/release-batch")
+        async def release_batch(body: dict):
+            if self._fail("release-batch"):
+                return JSONResponse({"detail": "Internal Server Error"}, status_code=500)
+            released = {key: self.reservations.pop(key) for key in list(self.reservations) if key[0] in body["order_ids"]}
+            if released:
+                self.batches[body["batch_id"]] = released
+            return {"message": "Stock released successfully", "batch_id": body["batch_id"], "applied": bool(released)}
+
+        @app.post("/api/v1/payments")
+        async def create_payment(body: dict):
+            existing = self.payments.get(body["order_id"])
+            if existing is None:
+                existing = self.payments[body["order_id"]] = {
+                    "id": str(ObjectId()),
+                    "order_id": body["order_id"],
+                    "status": "processing" if self.processing_polls else "completed"
+                }
+                status_code = 201
+            else:
+                status_code = 200
+            if self._fail("pay"):
+                return JSONResponse({"detail": "Internal Server Error"}, status_code=500)
+            return JSONResponse(existing, status_code=status_code)
+
+        @app.get("/api/v1/payments/order/{order_id}")
+        async def payment_by_order(order_id: str, request: Request):
+            if order_id not in self.payments:
+                return JSONResponse({"detail": "Payment not found for this order"}, status_code=404)
+            payment = self.payments[order_id]
+            if payment["status"] == "processing":
+                self.processing_polls -= 1
+                if self.processing_polls <= 0:
+                    payment["status"] = "completed"
+            return payment
+
+        @app.post("/api/v1/payments/refund")
+        async def refund(body: dict):
+            payment = next(p for p in self.payments.values() if p["id"] == body["payment_id"])
+            if payment["status"] == "refunded":
+                return JSONResponse({"detail": "Payment already refunded"}, status_code=409)
+            if payment["status"] != "completed":
+                return JSONResponse({"detail": "Only completed payments can be refunded"}, status_code=400)
+            payment["status"] = "refunded"
+            self.refunds.append(body["payment_id"])
+            return {"message": "Payment refunded successfully", "payment_id": body["payment_id"]}
+
+        return app
+
+@pytest_asyncio.fixture
+async def mongo():
+    db.client = AsyncMongoMockClient()
+    db.db = db.client["orders_test"]
+    yield db.db
+    db.client = db.db = None
+
+@pytest.fixture
+def services():
+    return FakeServices()
+
+@pytest_asyncio.fixture
+async def saga(mongo, services):
+    saga = CheckoutSaga()
+    saga.transport = httpx.ASGITransport(app=services.app)
+    await saga.start()
+    yield saga
+    await saga.stop()
+
+async def place_order(mongo, saga, items, created_at=None) -> ObjectId:
+    """Insert a PENDING order and its saga the way POST /orders does."""
+    now = created_at or datetime.utcnow()
+    order = {
+        "user_id": "user-1",
+        "items": [
+            {"product_id": product_id, "product_name": product_id, "quantity": quantity, "price": 10.0}
+            for product_id, quantity in items
+        ],
+        "shipping_address": {},
+        "payment_method": "credit_card",
+        "status": OrderStatus.PENDING,
+        "total_amount": 10.0 * sum(quantity for _, quantity in items),
+        "tracking_number": None,
+        "created_at": now,
+        "updated_at": now
+    }
+    await mongo.orders.insert_one(order)
+    await mongo[SAGA_COLLECTION].insert_one({**saga.new_saga(order["_id"]), "created_at": now})
+    return order["_id"]
@@ -0,0 +1,158 @@
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from app import expiry as expiry_module
+from app.config import settings
+from app.expiry import EXPIRED, EXPIRING, OrderExpiry
+from app.leader import LeaderLease
+from app.models import OrderStatus
+from app.outbox import OUTBOX_COLLECTION
+from app.saga import SAGA_COLLECTION, COMPENSATING, PAYING, RESERVING, CheckoutSaga
+
+from tests.conftest import place_order
+
+pytestmark = pytest.mark.asyncio
+
+@pytest_asyncio.fixture
+async def expiry(mongo, services):
+    expiry = OrderExpiry()
+    expiry._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=services.app))
+    yield expiry
+    await expiry._client.aclose()
+
+def old() -> datetime:
+    return datetime.utcnow() - timedelta(minutes=settings.ORDER_PENDING_TTL_MINUTES + 1)
+
+async def stall(mongo, order_id, state=RESERVING, reserved=(), payment_attempted=False):
+    """Leave the order's saga as a dead worker would have."""
+    await mongo[SAGA_COLLECTION].update_one(
+        {"_id": order_id},
+        {"$set": {
+            "state": state,
+            "reserved": [{"product_id": p, "quantity": q} for p, q in reserved],
+            "payment_attempted": payment_attempted,
+            "owner": "dead-worker",
+            "lease_until": datetime.utcnow() - timedelta(seconds=1)
+        }}
+    )
+
+async def cancelled_events(mongo):
+    return await mongo[OUTBOX_COLLECTION].count_documents({"type": "order.cancelled"})
+
+async def test_lease_has_one_holder_until_it_expires(mongo):
+    first, second = LeaderLease("job", 60), LeaderLease("job", 60)
+
+    assert await first.acquire()
+    assert await first.acquire()
+    assert not await second.acquire()
+
+    await mongo.leader_leases.update_one({"_id": "job"}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+    assert await second.acquire()
+    assert not await first.acquire()
+
+    await second.release()
+    assert await first.acquire()
+
+async def test_expires_stuck_orders_with_one_release_batch(mongo, services, expiry):
+    saga = CheckoutSaga()
+    stuck = await place_order(mongo, saga, [("p1", 2), ("p2", 1)], created_at=old())
+    await stall(mongo, stuck, reserved=[("p1", 2), ("p2", 1)])
+    services.reservations.update({(str(stuck), "p1"): 2, (str(stuck), "p2"): 1})
+    other = await place_order(mongo, saga, [("p1", 1)], created_at=old())
+    await stall(mongo, other, reserved=[("p1", 1)])
+    services.reservations[(str(other), "p1")] = 1
+    running = await place_order(mongo, saga, [("p1", 1)], created_at=old())
+    recent = await place_order(mongo, saga, [("p1", 1)])
+
+    assert await expiry.run_once() == 2
+
+    for order_id in (stuck, other):
+        assert (await mongo.orders.find_one({"_id": order_id}))["status"] == OrderStatus.CANCELLED
+        assert (await mongo[SAGA_COLLECTION].find_one({"_id": order_id}))["state"] == EXPIRED
+    for order_id in (running, recent):
+        assert (await mongo.orders.find_one({"_id": order_id}))["status"] == OrderStatus.PENDING
+    [batch] = services.batches.values()
+    assert batch == {(str(stuck), "p1"): 2, (str(stuck), "p2"): 1, (str(other), "p1"): 1}
+    assert services.reservations == {}
+    assert await cancelled_events(mongo) == 2
+
+async def test_failed_release_is_resent_on_the_next_run(mongo, services, expiry):
+    order_id = await place_order(mongo, CheckoutSaga(), [("p1", 2)], created_at=old())
+    await stall(mongo, order_id, reserved=[("p1", 2)])
+    services.reservations[(str(order_id), "p1")] = 2
+    services.fail_next["release-batch"] = 1
+
+    assert await expiry.run_once() == 1
+    assert (await mongo[SAGA_COLLECTION].find_one({"_id": order_id}))["state"] == EXPIRING
+
+    assert await expiry.run_once() == 0
+    assert (await mongo[SAGA_COLLECTION].find_one({"_id": order_id}))["state"] == EXPIRED
+    assert len(services.batches) == 1
+
+async def test_order_without_saga_is_cancelled_without_release(mongo, services, expiry):
+    order_id = await place_order(mongo, CheckoutSaga(), [("p1", 1)], created_at=old())
+    await mongo[SAGA_COLLECTION].delete_one({"_id": order_id})
+
+    assert await expiry.run_once() == 1
+    assert (await mongo.orders.find_one({"_id": order_id}))["status"] == OrderStatus.CANCELLED
+    assert services.batches == {}
+
+async def test_charged_saga_is_handed_back_to_compensate(mongo, services, expiry):
+    order_id = await place_order(mongo, CheckoutSaga(), [("p1", 1)], created_at=old())
+    await stall(mongo, order_id, state=PAYING, reserved=[("p1", 1)], payment_attempted=True)
+
+    assert await expiry.run_once() == 0
+    assert (await mongo[SAGA_COLLECTION].find_one({"_id": order_id}))["state"] == COMPENSATING
+    assert (await mongo.orders.find_one({"_id": order_id}))["status"] == OrderStatus.PENDING
+    assert services.batches == {}
+
+async def test_order_cancelled_by_user_meanwhile_gets_no_second_event(mongo, services, expiry, monkeypatch):
+    order_id = await place_order(mongo, CheckoutSaga(), [("p1", 1)], created_at=old())
+    await stall(mongo, order_id, reserved=[("p1", 1)])
+    services.reservations[(str(order_id), "p1")] = 1
+    run_in_transaction = expiry_module.run_in_transaction
+
+    async def cancel_first(callback):
+        # The user cancels between the expiry job's read and its write
+        await mongo.orders.update_one({"_id": order_id}, {"$set": {"status": OrderStatus.CANCELLED}})
+        return await run_in_transaction(callback)
+
+    monkeypatch.setattr(expiry_module, "run_in_transaction", cancel_first)
+
+    assert await expiry.run_once() == 0
+    assert await cancelled_events(mongo) == 0
+    # The claimed saga's stock is still released
+    assert (await mongo[SAGA_COLLECTION].find_one({"_id": order_id}))["state"] == EXPIRED
+    assert len(services.batches) == 1
+
+async def test_reservation_the_saga_never_recorded_is_released(mongo, services, expiry):
+    order_id = await place_order(mongo, CheckoutSaga(), [("p1", 2)], created_at=old())
+    # The worker died after inventory reserved but before the saga noted it
+    await stall(mongo, order_id)
+    services.reservations[(str(order_id), "p1")] = 2
+
+    assert await expiry.run_once() == 1
+    assert services.reservations == {}
+    assert (await mongo[SAGA_COLLECTION].find_one({"_id": order_id}))["state"] == EXPIRED
+
+async def test_claimed_batch_whose_cancel_was_lost_is_cancelled_on_retry(mongo, services, expiry):
+    order_id = await place_order(mongo, CheckoutSaga(), [("p1", 1)], created_at=old())
+    services.reservations[(str(order_id), "p1")] = 1
+    # Without a transaction, the run died after claiming the saga
+    await mongo[SAGA_COLLECTION].update_one(
+        {"_id": order_id}, {"$set": {"state": EXPIRING, "expiry_batch": "lost-batch"}}
+    )
+
+    assert await expiry.run_once() == 1
+    order = await mongo.orders.find_one({"_id": order_id})
+    assert order["status"] == OrderStatus.CANCELLED
+    assert order["expiry_batch"] == "lost-batch"
+    assert await cancelled_events(mongo) == 1
+    assert (await mongo[SAGA_COLLECTION].find_one({"_id": order_id}))["state"] == EXPIRED
+    assert services.reservations == {}
+
+    assert await expiry.run_once() == 0
+    assert await cancelled_events(mongo) == 1
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import OrderStatus
+from app.saga import SAGA_COLLECTION, COMPENSATED, COMPLETED, PAYING, CheckoutSaga
+
+from tests.conftest import place_order
+
+pytestmark = pytest.mark.asyncio
+
+async def test_checkout_reserves_pays_and_confirms(mongo, services, saga):
+    services.stock.update({"p1": 5, "p2": 5})
+    order_id = await place_order(mongo, saga, [("p1", 2), ("p2", 1)])
+
+    saga.launch(order_id)
+    await saga.drain()
+
+    state = await mongo[SAGA_COLLECTION].find_one({"_id": order_id})
+    assert state["state"] == COMPLETED
+    assert state["payment_id"] == services.payments[str(order_id)]["id"]
+    assert services.reservations == {(str(order_id), "p1"): 2, (str(order_id), "p2"): 1}
+    assert (await mongo.orders.find_one({"_id": order_id}))["status"] == OrderStatus.CONFIRMED
+
+async def test_rejected_reservation_releases_and_cancels(mongo, services, saga):
+    services.stock.update({"p1": 5, "p2": 0})
+    order_id = await place_order(mongo, saga, [("p1", 2), ("p2", 1)])
+
+    saga.launch(order_id)
+    await saga.drain()
+
+    state = await mongo[SAGA_COLLECTION].find_one({"_id": order_id})
+    assert state["state"] == COMPENSATED
+    assert state["released"] == 1
+    assert services.reservations == {}
+    assert services.payments == {}
+    assert (await mongo.orders.find_one({"_id": order_id}))["status"] == OrderStatus.CANCELLED
+
+async def test_retried_calls_reserve_and_charge_once(mongo, services, saga):
+    services.stock["p1"] = 5
+    # Both calls succeed but answer 500, so the saga sends them again
+    services.fail_next.update({"reserve": 1, "pay": 1})
+    order_id = await place_order(mongo, saga, [("p1", 3)])
+
+    saga.launch(order_id)
+    await saga.drain()
+
+    assert (await mongo[SAGA_COLLECTION].find_one({"_id": order_id}))["state"] == COMPLETED
+    assert services.reserved("p1") == 3
+    assert len(services.payments) == 1
+
+async def test_cancel_after_confirm_refunds_and_releases(mongo, services, saga):
+    services.stock["p1"] = 5
+    order_id = await place_order(mongo, saga, [("p1", 2)])
+    saga.launch(order_id)
+    await saga.drain()
+
+    await mongo.orders.update_one({"_id": order_id}, {"$set": {"status": OrderStatus.CANCELLED}})
+    await saga.order_cancelled(order_id)
+    await saga.drain()
+
+    assert (await mongo[SAGA_COLLECTION].find_one({"_id": order_id}))["state"] == COMPENSATED
+    assert services.refunds == [services.payments[str(order_id)]["id"]]
+    assert services.reservations == {}
+
+async def test_expired_lease_is_resumed_without_charging_again(mongo, services, saga):
+    services.stock["p1"] = 5
+    order_id = await place_order(mongo, saga, [("p1", 1)])
+    # Another worker reserved and charged, then died before recording the payment
+    services.reservations[(str(order_id), "p1")] = 1
+    services.payments[str(order_id)] = {"id": "pay-1", "order_id": str(order_id), "status": "completed"}
+    await mongo[SAGA_COLLECTION].update_one(
+        {"_id": order_id},
+        {"$set": {
+            "state": PAYING,
+            "reserved": [{"product_id": "p1", "quantity": 1}],
+            "payment_attempted": True,
+            "owner": "dead-worker",
+            "lease_until": datetime.utcnow() - timedelta(seconds=1)
+        }}
+    )
+
+    saga.launch(order_id)
+    await saga.drain()
+
+    state = await mongo[SAGA_COLLECTION].find_one({"_id": order_id})
+    assert state["state"] == COMPLETED
+    assert state["owner"] == saga.owner
+    assert state["payment_id"] == "pay-1"
+    assert len(services.payments) == 1
+
+async def test_live_lease_is_not_taken_over(mongo, services, saga):
+    services.stock["p1"] = 5
+    other = CheckoutSaga()
+    order_id = await place_order(mongo, other, [("p1", 1)])
+
+    saga.launch(order_id)
+    await saga.drain()
+
+    state = await mongo[SAGA_COLLECTION].find_one({"_id": order_id})
+    assert state["owner"] == other.owner
+    assert services.reservations == {}
+
+async def test_processing_payment_is_awaited_not_compensated(mongo, services, saga):
+    services.stock["p1"] = 5
+    services.processing_polls = 2
+    order_id = await place_order(mongo, saga, [("p1", 1)])
+
+    saga.launch(order_id)
+    await saga.drain()
+
+    state = await mongo[SAGA_COLLECTION].find_one({"_id": order_id})
+    assert state["state"] == COMPLETED
+    assert state["payment_id"] == services.payments[str(order_id)]["id"]
+    assert services.refunds == []
+
+async def test_payment_still_processing_leaves_saga_to_recovery(mongo, services, saga):
+    services.stock["p1"] = 5
+    services.processing_polls = 100
+    order_id = await place_order(mongo, saga, [("p1", 1)])
+
+    saga.launch(order_id)
+    await saga.drain()
+
+    state = await mongo[SAGA_COLLECTION].find_one({"_id": order_id})
+    assert state["state"] == PAYING
+    assert (await mongo.orders.find_one({"_id": order_id}))["status"] == OrderStatus.PENDING
+    assert services.reservations == {(str(order_id), "p1"): 1}
+
+async def test_already_refunded_payment_still_compensates(mongo, services, saga):
+    services.stock["p1"] = 5
+    order_id = await place_order(mongo, saga, [("p1", 1)])
+    saga.launch(order_id)
+    await saga.drain()
+    services.payments[str(order_id)]["status"] = "refunded"
+
+    await mongo.orders.update_one({"_id": order_id}, {"$set": {"status": OrderStatus.CANCELLED}})
+    await saga.order_cancelled(order_id)
+    await saga.drain()
+
+    assert (await mongo[SAGA_COLLECTION].find_one({"_id": order_id}))["state"] == COMPENSATED
+    assert services.reservations == {}
@@ -1,5 +1,14 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+from pymongo.write_concern import WriteConcern
+from typing import Optional
+from pymongo.errors import OperationFailure
 from app.config import settings
+from app.metrics import MongoCommandMetrics, MongoPoolMetrics
+from app.tracing import MongoCommandTracing
+from app.dbstats import DBStatsListener
+from app.slowquery import SlowQueryListener
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,10 +21,83 @@ db = Database()
 
 async def connect_to_mongo():
     logger.info("Connecting to MongoDB...")
-    db.client = AsyncIOMotorClient(settings.MONGODB_URI)
+    db.client = AsyncIOMotorClient(settings.MONGODB_URI, **client_options())
     db.db = db.client[settings.MONGODB_DB_NAME]
+    log_client_configuration()
     logger.info("Connected to MongoDB successfully")
 
+def client_options() -> dict:
+    options = {
+        "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+        "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGODB_MAX_IDLE_TIME_MS,
+        "compressors": settings.MONGODB_COMPRESSORS,
+        "serverSelectionTimeoutMS": settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": settings.MONGODB_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": settings.MONGODB_SOCKET_TIMEOUT_MS,
+        "waitQueueTimeoutMS": settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        "event_listeners": [
+            MongoCommandMetrics(),
+            MongoPoolMetrics(),
+            MongoCommandTracing(),
+            DBStatsListener(),
+            SlowQueryListener(),
+        ],
+    }
+    if settings.MONGODB_READ_PREFERENCE:
+        options["readPreference"] = settings.MONGODB_READ_PREFERENCE
+    if settings.MONGODB_READ_CONCERN:
+        options["readConcernLevel"] = settings.MONGODB_READ_CONCERN
+    if settings.MONGODB_WRITE_CONCERN:
+        options["w"] = _parse_w(settings.MONGODB_WRITE_CONCERN)
+    return options
+
+def log_client_configuration():
+    pool = db.client.options.pool_options
+    logger.info(
+        "MongoDB client configuration: "
+        f"min_pool_size={pool.min_pool_size} "
+        f"max_pool_size={pool.max_pool_size} "
+        f"max_idle_time_seconds={pool.max_idle_time_seconds} "
+        f"compressors={settings.MONGODB_COMPRESSORS} "
+        f"server_selection_timeout={db.client.options.server_selection_timeout} "
+        f"connect_timeout={pool.connect_timeout} "
+        f"socket_timeout={pool.socket_timeout} "
+        f"wait_queue_timeout={pool.wait_queue_timeout} "
+        f"read_preference={db.client.read_preference.mongos_mode} "
+        f"read_concern={db.client.read_concern.level or 'server default'} "
+        f"write_concern={db.client.write_concern.document or 'server default'}"
+    )
+
+def _parse_w(value: str):
+    return int(value) if value.isdigit() else value
+
+def get_collection(
+    name: str,
+    read_preference: Optional[str] = None,
+    read_concern: Optional[str] = None,
+    write_concern: Optional[str] = None
+) -> AsyncIOMotorCollection:
+    """Collection handle with per-collection overrides of the client defaults."""
+    return db.db.get_collection(
+        name,
+        read_preference=(
+            make_read_preference(read_pref_mode_from_name(read_preference), None)
+            if read_preference else None
+        ),
+        read_concern=ReadConcern(read_concern) if read_concern else None,
+        write_concern=WriteConcern(w=_parse_w(write_concern)) if write_concern else None
+    )
+
+async def ensure_indexes():
+    try:
+        # One payment per order; create_payment relies on it to make retries safe
+        await db.db.payments.create_index("order_id", unique=True)
+    except OperationFailure as e:
+        # Duplicates from before the index prevent the build; keep serving and
+        # let an operator clean them up with scripts/dedupe_payments.py
+        logger.error(f"Could not create unique order_id index: {str(e)}")
+
 async def close_mongo_connection():
     logger.info("Closing MongoDB connection...")
     db.client.close()
@@ -0,0 +1,107 @@
+from typing import List, Optional
+import asyncio
+import logging
+import time
+
+from app.config import settings
+from app.database import db
+from app.metrics import Gauge, MONGO_POOL_CHECKED_OUT
+
+logger = logging.getLogger(__name__)
+
+SERVICE_READY = Gauge("service_ready", "1 when the readiness probe reports ready")
+EVENT_LOOP_LAG = Gauge("event_loop_lag_seconds", "Worst event loop lag over the last readiness interval")
+
+# How often the event loop lag is sampled between heartbeats
+LAG_SAMPLE_INTERVAL = 0.25
+
+class ReadinessMonitor:
+    """
+    Readiness state maintained by a background heartbeat, so probes are
+    answered from memory instead of each sending a `ping` to MongoDB.
+
+    Not ready when MongoDB has failed READINESS_FAILURE_THRESHOLD heartbeats
+    in a row (or has never answered), when the connection pool is nearly
+    exhausted, or when the event loop is lagging.
+    """
+
+    def __init__(self):
+        self.mongo_ok = False
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self.last_heartbeat: Optional[float] = None
+        self.loop_lag = 0.0
+        self.pool_saturation = 0.0
+        self._lag_window_max = 0.0
+        self._tasks: List[asyncio.Task] = []
+
+    async def _ping(self) -> None:
+        try:
+            await asyncio.wait_for(
+                db.client.admin.command("ping"),
+                timeout=settings.READINESS_TIMEOUT_SECONDS
+            )
+        except Exception as e:
+            self.consecutive_failures += 1
+            self.last_error = str(e) or type(e).__name__
+            if self.consecutive_failures >= settings.READINESS_FAILURE_THRESHOLD:
+                if self.mongo_ok:
+                    logger.error(f"MongoDB heartbeat failing: {self.last_error}")
+                self.mongo_ok = False
+        else:
+            self.consecutive_failures = 0
+            self.last_error = None
+            self.mongo_ok = True
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await self._ping()
+            # Pool sizes are per server, so look at the busiest one
+            checked_out = max(MONGO_POOL_CHECKED_OUT.values().values(), default=0.0)
+            self.pool_saturation = checked_out / settings.MONGODB_MAX_POOL_SIZE
+            self.loop_lag, self._lag_window_max = self._lag_window_max, 0.0
+            self.last_heartbeat = time.time()
+            EVENT_LOOP_LAG.set(self.loop_lag)
+            SERVICE_READY.set(1.0 if not self.reasons() else 0.0)
+            await asyncio.sleep(settings.READINESS_INTERVAL_SECONDS)
+
+    async def _sample_loop_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LAG_SAMPLE_INTERVAL
+            await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+            self._lag_window_max = max(self._lag_window_max, loop.time() - expected)
+
+    def reasons(self) -> List[str]:
+        """Why the service is not ready; empty when it is."""
+        reasons = []
+        if not self.mongo_ok:
+            reasons.append(f"mongodb unavailable: {self.last_error or 'no successful heartbeat yet'}")
+        if self.pool_saturation >= settings.READINESS_MAX_POOL_SATURATION:
+            reasons.append(f"connection pool saturated ({self.pool_saturation:.0%})")
+        if self.loop_lag * 1000 >= settings.READINESS_MAX_LOOP_LAG_MS:
+            reasons.append(f"event loop lag {self.loop_lag * 1000:.0f}ms")
+        return reasons
+
+    def checks(self) -> dict:
+        return {
+            "mongodb": self.mongo_ok,
+            "consecutive_failures": self.consecutive_failures,
+            "pool_saturation": round(self.pool_saturation, 3),
+            "event_loop_lag_ms": round(self.loop_lag * 1000, 1),
+            "last_heartbeat": self.last_heartbeat,
+        }
+
+    async def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._heartbeat()),
+            asyncio.create_task(self._sample_loop_lag()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+readiness = ReadinessMonitor()
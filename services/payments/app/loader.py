@@ -0,0 +1,83 @@
+from typing import Callable, Dict, Optional, Set
+import asyncio
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.config import settings
+from app.metrics import Counter
+
+LOADER_BATCHES = Counter("loader_batches_total", "Batched $in queries issued", ("collection",))
+LOADER_KEYS = Counter("loader_keys_total", "_id lookups resolved through the loader", ("collection",))
+
+class DocumentLoader:
+    """
+    DataLoader-style batching of `find_one({"_id": ...})` lookups.
+
+    Lookups made within `window_ms` of the first pending one (0 means "the
+    rest of this event-loop iteration") are resolved together with one
+    `{"_id": {"$in": [...]}}` query; each caller gets its own document or
+    None. Duplicate ids in a batch share one document, so callers must not
+    mutate what they receive.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        collection: Callable[[], AsyncIOMotorCollection],
+        projection: Optional[dict] = None,
+        window_ms: Optional[float] = None,
+        max_batch: Optional[int] = None
+    ):
+        self.name = name
+        self.collection = collection
+        self.projection = projection
+        self.window = (settings.LOADER_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self.max_batch = max_batch or settings.LOADER_MAX_BATCH
+        self._pending: Dict[ObjectId, asyncio.Future] = {}
+        self._handle: Optional[asyncio.Handle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def load(self, _id: ObjectId) -> Optional[dict]:
+        future = self._pending.get(_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[_id] = future
+            if len(self._pending) >= self.max_batch:
+                self._dispatch()
+            elif self._handle is None:
+                if self.window > 0:
+                    self._handle = loop.call_later(self.window, self._dispatch)
+                else:
+                    self._handle = loop.call_soon(self._dispatch)
+        # Shielded so one cancelled caller does not fail the others sharing the id
+        return await asyncio.shield(future)
+
+    def _dispatch(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._fetch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, batch: Dict[ObjectId, asyncio.Future]) -> None:
+        LOADER_BATCHES.inc(self.name)
+        LOADER_KEYS.inc(self.name, amount=len(batch))
+        try:
+            cursor = self.collection().find({"_id": {"$in": list(batch)}}, self.projection)
+            found = {doc["_id"]: doc async for doc in cursor}
+        except Exception as exc:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(exc)
+                    # Retrieved by the waiters; avoid "never retrieved" noise if they left
+                    future.add_done_callback(lambda f: f.exception())
+            return
+        for _id, future in batch.items():
+            if not future.done():
+                future.set_result(found.get(_id))
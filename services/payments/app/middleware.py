@@ -0,0 +1,153 @@
+from contextvars import ContextVar
+import logging
+import os
+import random
+import time
+import uuid
+
+from app.dbstats import RequestDBStats, db_stats_var
+from app.metrics import (
+    DB_BYTES_PER_REQUEST,
+    DB_CALLS_PER_REQUEST,
+    DB_TIME_PER_REQUEST,
+    HTTP_IN_FLIGHT,
+    HTTP_LATENCY,
+    HTTP_REQUESTS
+)
+from app.tracing import (
+    SPAN_KIND_SERVER,
+    STATUS_ERROR,
+    Span,
+    current_span,
+    parse_traceparent,
+    trace_id_from_correlation_id,
+    tracer
+)
+
+logger = logging.getLogger(__name__)
+
+# Correlation ID of the request being handled, for code without access to it
+correlation_id_var: ContextVar[str] = ContextVar("correlation_id", default="unknown")
+
+class RequestContextMiddleware:
+    """
+    Correlation ID propagation, timing, request metrics, the server span,
+    per-request MongoDB accounting and access logging as pure ASGI.
+
+    Unlike `@app.middleware("http")` this does not run the endpoint in a
+    separate task or wrap the response body; it only adds headers to the
+    `http.response.start` message, so streaming responses pass straight through.
+    """
+
+    def __init__(
+        self,
+        app,
+        sample_rate: float = 1.0,
+        slow_request_ms: float = 500.0,
+        expose_db_stats: bool = False
+    ):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_request_s = slow_request_ms / 1000
+        self.expose_db_stats = expose_db_stats
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        correlation_id = None
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"x-correlation-id":
+                correlation_id = value.decode("latin-1")
+            elif name == b"traceparent":
+                traceparent = value.decode("latin-1")
+        if not correlation_id:
+            correlation_id = str(uuid.uuid4())
+
+        # Exposed to handlers as request.state.correlation_id
+        scope.setdefault("state", {})["correlation_id"] = correlation_id
+        token = correlation_id_var.set(correlation_id)
+
+        span = None
+        if tracer.enabled:
+            # Continue the caller's trace, or start one keyed on the correlation ID
+            trace_context = parse_traceparent(traceparent)
+            if trace_context:
+                trace_id, parent_id = trace_context
+            else:
+                trace_id, parent_id = trace_id_from_correlation_id(correlation_id), None
+            span = Span(
+                f"{scope['method']} {scope['path']}",
+                trace_id,
+                parent_id,
+                SPAN_KIND_SERVER,
+                {"http.method": scope["method"], "http.target": scope["path"], "correlation_id": correlation_id}
+            )
+            span_token = current_span.set(span)
+
+        db_stats = RequestDBStats()
+        db_stats_token = db_stats_var.set(db_stats)
+
+        start = time.perf_counter_ns()
+        status_code = 500
+        HTTP_IN_FLIGHT.inc()
+
+        async def send_with_headers(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                process_time = (time.perf_counter_ns() - start) / 1e9
+                headers = list(message.get("headers", []))
+                headers.append((b"x-correlation-id", correlation_id.encode("latin-1")))
+                headers.append((b"x-process-time", str(process_time).encode()))
+                if self.expose_db_stats:
+                    headers.append((b"x-db-calls", str(db_stats.commands).encode()))
+                    headers.append((b"server-timing", db_stats.server_timing().encode()))
+                if scope["path"].startswith(("/debug", "/metrics")):
+                    # Per-process state: say which worker answered
+                    headers.append((b"x-worker", str(os.getpid()).encode()))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            process_time = (time.perf_counter_ns() - start) / 1e9
+            correlation_id_var.reset(token)
+            db_stats_var.reset(db_stats_token)
+            HTTP_IN_FLIGHT.dec()
+            # Label by route template, not raw path, to bound cardinality
+            route_path = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUESTS.inc(scope["method"], route_path, str(status_code))
+            HTTP_LATENCY.observe(process_time, scope["method"], route_path)
+            DB_CALLS_PER_REQUEST.observe(db_stats.commands, scope["method"], route_path)
+            DB_TIME_PER_REQUEST.observe(db_stats.duration_micros / 1e6, scope["method"], route_path)
+            DB_BYTES_PER_REQUEST.observe(db_stats.reply_bytes, scope["method"], route_path)
+            if span:
+                current_span.reset(span_token)
+                span.name = f"{scope['method']} {route_path}"
+                span.set_attribute("http.route", route_path)
+                span.set_attribute("http.status_code", status_code)
+                if status_code >= 500:
+                    span.status = STATUS_ERROR
+                span.end()
+            sampled_out = (
+                status_code < 400
+                and process_time < self.slow_request_s
+                and random.random() >= self.sample_rate
+            )
+            if not sampled_out:
+                logger.info(
+                    "Request completed",
+                    extra={
+                        "correlation_id": correlation_id,
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status_code": status_code,
+                        "process_time": process_time,
+                        "db_calls": db_stats.commands,
+                        "db_time_ms": db_stats.duration_ms
+                    }
+                )
@@ -1,20 +1,52 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
 import logging
 import uuid
 from datetime import datetime
 
 from app.models import PaymentCreate, Payment, PaymentStatus, RefundRequest
 from app.database import get_database
+from app.config import settings
+from app.etag import (
+    ETAG_PROJECTION,
+    PRIVATE_CACHE_CONTROL,
+    compute_etag,
+    is_conditional,
+    etag_matches,
+    not_modified,
+    set_cache_headers
+)
+from app.singleflight import SingleFlight
+from app.cache import TwoTierCache, cache_backend
+from app.loader import DocumentLoader
+from app.outbox import record_event, run_in_transaction
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Checkout pages poll the same order's payment concurrently; share one query
+payment_status_reads = SingleFlight("payment_by_order")
+
+# Payment status by order, shared across replicas. Status changes invalidate
+# it; the short soft TTL bounds a poll that raced the write
+payment_status_cache = TwoTierCache(
+    "payment_by_order",
+    cache_backend,
+    soft_ttl=settings.PAYMENT_STATUS_CACHE_SOFT_TTL_SECONDS,
+    hard_ttl=settings.PAYMENT_STATUS_CACHE_HARD_TTL_SECONDS
+)
+
+# Concurrent payment reads by id are resolved with one $in query per window
+payment_loader = DocumentLoader("payments", lambda: get_database().payments)
+
 @router.post("/payments", response_model=Payment, status_code=status.HTTP_201_CREATED)
-async def create_payment(payment: PaymentCreate):
+async def create_payment(payment: PaymentCreate, response: Response):
     """
     Create a payment transaction (stub implementation)
     In production, this would integrate with Stripe, PayPal, etc.
+    Payments are unique per order: a repeated request returns the existing
+    payment with 200 instead of charging again.
     """
     db = get_database()
     
@@ -32,7 +64,13 @@ async def create_payment(payment: PaymentCreate):
         "updated_at": datetime.utcnow()
     }
     
-    result = await db.payments.insert_one(payment_dict)
+    try:
+        result = await db.payments.insert_one(payment_dict)
+    except DuplicateKeyError:
+        existing = await db.payments.find_one({"order_id": payment.order_id})
+        logger.info(f"Payment for order {payment.order_id} already exists: {existing['transaction_id']}")
+        response.status_code = status.HTTP_200_OK
+        return existing
     
     # Simulate successful payment (in production, this would be async)
     await db.payments.update_one(
@@ -40,68 +78,62 @@ async def create_payment(payment: PaymentCreate):
         {"$set": {"status": PaymentStatus.COMPLETED, "updated_at": datetime.utcnow()}}
     )
     
+    # Drops a cached "no payment yet" from checkout polling
+    await payment_status_cache.invalidate(payment.order_id)
+    
     created_payment = await db.payments.find_one({"_id": result.inserted_id})
     
     logger.info(f"Payment created: {transaction_id} for order {payment.order_id}")
     
-    return Payment(
-        id=str(created_payment["_id"]),
-        order_id=created_payment["order_id"],
-        amount=created_payment["amount"],
-        currency=created_payment["currency"],
-        payment_method=created_payment["payment_method"],
-        status=created_payment["status"],
-        transaction_id=created_payment["transaction_id"],
-        created_at=created_payment["created_at"],
-        updated_at=created_payment["updated_at"]
-    )
+    return created_payment
 
 @router.get("/payments/{payment_id}", response_model=Payment)
-async def get_payment(payment_id: str):
+async def get_payment(payment_id: str, request: Request, response: Response):
     """Get payment details by ID"""
     db = get_database()
     
     if not ObjectId.is_valid(payment_id):
         raise HTTPException(status_code=400, detail="Invalid payment ID")
     
-    payment = await db.payments.find_one({"_id": ObjectId(payment_id)})
+    # Revalidate against the timestamps only, skipping the full document
+    if is_conditional(request):
+        stamp = await db.payments.find_one({"_id": ObjectId(payment_id)}, ETAG_PROJECTION)
+        if not stamp:
+            raise HTTPException(status_code=404, detail="Payment not found")
+        etag = compute_etag(stamp)
+        if etag_matches(request, etag):
+            return not_modified(etag, PRIVATE_CACHE_CONTROL)
+    
+    payment = await payment_loader.load(ObjectId(payment_id))
     
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
     
-    return Payment(
-        id=str(payment["_id"]),
-        order_id=payment["order_id"],
-        amount=payment["amount"],
-        currency=payment["currency"],
-        payment_method=payment["payment_method"],
-        status=payment["status"],
-        transaction_id=payment.get("transaction_id"),
-        created_at=payment["created_at"],
-        updated_at=payment["updated_at"]
-    )
+    set_cache_headers(response, compute_etag(payment), PRIVATE_CACHE_CONTROL)
+    
+    return payment
 
 @router.get("/payments/order/{order_id}", response_model=Payment)
-async def get_payment_by_order(order_id: str):
+async def get_payment_by_order(order_id: str, request: Request):
     """Get payment details by order ID"""
     db = get_database()
     
-    payment = await db.payments.find_one({"order_id": order_id})
+    # Callers acting on the answer (the checkout saga) ask for no-cache
+    if "no-cache" in request.headers.get("cache-control", ""):
+        payment = await db.payments.find_one({"order_id": order_id})
+    else:
+        payment = await payment_status_cache.get_or_load(
+            order_id,
+            lambda: payment_status_reads.do(
+                order_id,
+                lambda: db.payments.find_one({"order_id": order_id})
+            )
+        )
     
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found for this order")
     
-    return Payment(
-        id=str(payment["_id"]),
-        order_id=payment["order_id"],
-        amount=payment["amount"],
-        currency=payment["currency"],
-        payment_method=payment["payment_method"],
-        status=payment["status"],
-        transaction_id=payment.get("transaction_id"),
-        created_at=payment["created_at"],
-        updated_at=payment["updated_at"]
-    )
+    return payment
 
 @router.post("/payments/refund")
 async def refund_payment(refund: RefundRequest):
@@ -119,24 +151,49 @@ async def refund_payment(refund: RefundRequest):
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
     
+    # 409 tells a retried refund (the checkout saga) that it already happened
+    if payment["status"] == PaymentStatus.REFUNDED:
+        raise HTTPException(status_code=409, detail="Payment already refunded")
+    
     if payment["status"] != PaymentStatus.COMPLETED:
         raise HTTPException(
             status_code=400,
             detail="Only completed payments can be refunded"
         )
     
+    amount_refunded = refund.amount or payment["amount"]
+    
     # Update payment status
-    await db.payments.update_one(
-        {"_id": ObjectId(refund.payment_id)},
-        {"$set": {"status": PaymentStatus.REFUNDED, "updated_at": datetime.utcnow()}}
-    )
+    async def write(session):
+        # Guarded so concurrent refunds (saga compensation, manual) refund and publish once
+        result = await db.payments.update_one(
+            {"_id": ObjectId(refund.payment_id), "status": PaymentStatus.COMPLETED},
+            {"$set": {"status": PaymentStatus.REFUNDED, "updated_at": datetime.utcnow()}},
+            session=session
+        )
+        if result.modified_count == 0:
+            raise HTTPException(status_code=409, detail="Payment already refunded")
+        await record_event(
+            "payment.refunded",
+            refund.payment_id,
+            {
+                "payment_id": refund.payment_id,
+                "order_id": payment["order_id"],
+                "amount": amount_refunded,
+                "reason": refund.reason
+            },
+            session=session
+        )
+    
+    await run_in_transaction(write)
+    await payment_status_cache.invalidate(payment["order_id"])
     
     logger.info(f"Payment refunded: {payment['transaction_id']}")
     
     return {
         "message": "Payment refunded successfully",
         "payment_id": refund.payment_id,
-        "amount_refunded": refund.amount or payment["amount"]
+        "amount_refunded": amount_refunded
     }
 
 @router.get("/payments/verify/{transaction_id}")
@@ -0,0 +1,46 @@
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+import asyncio
+
+from app.metrics import Counter
+
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total", "Lookups that issued their own query", ("group",)
+)
+SINGLEFLIGHT_COALESCED = Counter(
+    "singleflight_coalesced_total", "Lookups that joined an identical in-flight query", ("group",)
+)
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """
+    Collapses concurrent identical lookups into one in-flight call.
+
+    The first caller for a key starts `fn()` as a task; callers arriving
+    before it finishes await the same task and receive the same result (or
+    exception). Nothing is cached: once the call completes the next lookup
+    queries again. The result object is shared, so callers must not mutate it.
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is not None:
+            SINGLEFLIGHT_COALESCED.inc(self.group)
+        else:
+            SINGLEFLIGHT_CALLS.inc(self.group)
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # A caller that disconnects must not cancel the query for everyone else
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every waiter went away
+            task.exception()
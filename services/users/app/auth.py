@@ -3,6 +3,7 @@ from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from app.config import settings
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +18,8 @@ def get_password_hash(password: str) -> str:
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(hours=settings.JWT_EXPIRATION_HOURS)
-    to_encode.update({"exp": expire})
+    # jti identifies the token so it can be revoked before it expires
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(
         to_encode,
         settings.JWT_SECRET,
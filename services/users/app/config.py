@@ -1,14 +1,109 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # MongoDB
     MONGODB_URI: str = "mongodb://localhost:27017/platform_db"
     MONGODB_DB_NAME: str = "platform_db"
     
+    # MongoDB client tuning
+    MONGODB_MIN_POOL_SIZE: int = 0
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MAX_IDLE_TIME_MS: int = 60_000
+    MONGODB_COMPRESSORS: str = "zstd,snappy,zlib"  # unavailable ones are skipped
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 5_000
+    MONGODB_CONNECT_TIMEOUT_MS: int = 5_000
+    MONGODB_SOCKET_TIMEOUT_MS: int = 30_000
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = 5_000
+    # Client-wide defaults; None leaves the value from the URI/driver in place
+    MONGODB_READ_PREFERENCE: Optional[str] = None
+    MONGODB_READ_CONCERN: Optional[str] = None
+    MONGODB_WRITE_CONCERN: Optional[str] = None
+    
     # Service
     SERVICE_NAME: str = "users"
+    # "production" hides per-request diagnostics such as X-DB-Calls/Server-Timing
+    ENVIRONMENT: str = "development"
     LOG_LEVEL: str = "INFO"
+    # Fraction of successful, fast requests that get an access log line;
+    # errors and requests slower than LOG_SLOW_REQUEST_MS are always logged
+    LOG_SAMPLE_RATE: float = 1.0
+    LOG_SLOW_REQUEST_MS: float = 500.0
+    
+    # Tracing: "none", "file" (OTLP/JSON lines) or "otlp" (OTLP/HTTP JSON)
+    TRACING_EXPORTER: str = "none"
+    TRACING_FILE_PATH: str = "traces.jsonl"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    
+    # Per-request MongoDB accounting; reply sizes cost one BSON re-encode per command
+    DB_STATS_REPLY_BYTES: bool = True
+    
+    # Server (app/server.py)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    WEB_CONCURRENCY: Optional[int] = None  # default: one worker per available CPU
+    SERVER_BACKLOG: int = 2048
+    # Longer than typical load balancer idle timeouts (60s) to avoid reset races
+    SERVER_KEEP_ALIVE_SECONDS: int = 75
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 25
+    SERVER_DRAIN_DELAY_SECONDS: float = 0.0
+    SERVER_LIMIT_CONCURRENCY: Optional[int] = None
+    
+    # Readiness heartbeat (app/health.py)
+    READINESS_INTERVAL_SECONDS: float = 5.0
+    READINESS_TIMEOUT_SECONDS: float = 2.0
+    READINESS_FAILURE_THRESHOLD: int = 3
+    READINESS_MAX_POOL_SATURATION: float = 0.95
+    READINESS_MAX_LOOP_LAG_MS: float = 500.0
+    
+    # Admission control (adaptive per-route-group concurrency limits, per worker)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_INITIAL_LIMIT: int = 32
+    ADMISSION_MIN_LIMIT: int = 4
+    ADMISSION_MAX_LIMIT: int = 256
+    ADMISSION_MAX_QUEUE: int = 64
+    ADMISSION_QUEUE_TIMEOUT_MS: float = 250.0
+    ADMISSION_LATENCY_TARGET_MS: float = 250.0
+    ADMISSION_BACKOFF_RATIO: float = 0.9
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+    
+    # _id lookup batching (0 ms = coalesce within one event-loop iteration)
+    LOADER_WINDOW_MS: float = 1.0
+    LOADER_MAX_BATCH: int = 100
+    
+    # Debug endpoints (/debug/*): disabled unless set, then X-Debug-Token must match
+    DEBUG_TOKEN: Optional[str] = None
+    
+    # Slow-query recorder (shapes served at /debug/slow-queries)
+    SLOW_QUERY_THRESHOLD_MS: float = 100.0
+    SLOW_QUERY_MAX_SHAPES: int = 100
+    SLOW_QUERY_EXPLAIN: bool = True
+    
+    # Profiling (/debug/profile) and event-loop stall logging; the stall
+    # threshold can also be changed at runtime via /debug/loop-monitor
+    PROFILE_MAX_SECONDS: int = 60
+    PROFILE_INTERVAL_MS: float = 5.0
+    LOOP_STALL_MONITOR_ENABLED: bool = True
+    LOOP_STALL_THRESHOLD_MS: float = 100.0
+    
+    # Response compression; encodings in server preference order (br and
+    # zstd are skipped when their modules are not installed)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_ENCODINGS: str = "zstd,br,gzip"
+    COMPRESSION_GZIP_LEVEL: int = 5
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    
+    # Two-tier cache (app/cache.py): "none" disables it, "memory" keeps the
+    # shared tier in-process (tests, single replica), "redis" shares it and
+    # broadcasts invalidations across replicas
+    CACHE_BACKEND: str = "none"
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_L1_MAX_ENTRIES: int = 10_000
+    CACHE_L1_TTL_SECONDS: float = 5.0  # bounds staleness if an invalidation is missed
+    CACHE_SOFT_TTL_SECONDS: float = 30.0  # served stale past this while one replica refreshes
+    CACHE_HARD_TTL_SECONDS: float = 300.0
     
     # CORS
     CORS_ORIGINS: List[str] = ["http://localhost:3001", "http://localhost:5173"]
@@ -18,6 +113,16 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRATION_HOURS: int = 24 * 7  # 7 days
     
+    # Token revocation
+    REVOCATION_REFRESH_SECONDS: float = 5.0
+    REVOCATION_REBUILD_EVERY: int = 120  # refreshes between full rebuilds
+    REVOCATION_BLOOM_CAPACITY: int = 100_000
+    REVOCATION_BLOOM_ERROR_RATE: float = 0.001
+    
+    # Internal service-to-service API
+    INTERNAL_API_KEY: str = "change-this-in-production"
+    BATCH_GET_MAX_IDS: int = 500
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
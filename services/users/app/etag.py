@@ -0,0 +1,38 @@
+from fastapi import Request, Response
+import hashlib
+
+# Only the fields needed to compute an ETag; used for cheap revalidation
+ETAG_PROJECTION = {"updated_at": 1, "created_at": 1}
+
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+def compute_etag(doc: dict) -> str:
+    """Strong ETag derived from the document ID and its last update time."""
+    stamp = doc.get("updated_at") or doc.get("created_at")
+    raw = f"{doc['_id']}:{stamp.isoformat() if stamp else ''}"
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so a W/ prefix still matches
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in header.split(",")
+    )
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(
+        status_code=304,
+        headers={"ETag": etag, "Cache-Control": cache_control}
+    )
+
+def set_cache_headers(response: Response, etag: str, cache_control: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
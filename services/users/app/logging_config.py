@@ -0,0 +1,72 @@
+from datetime import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName", "color_message"}
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "service": self.service,
+            "logger": record.name,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=_json_default)
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+class _DeferredFormatQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records without formatting them on the calling thread.
+
+    The stock QueueHandler renders the full message (and our JSON) before
+    enqueueing; here only the message arguments and traceback are resolved,
+    since they may change or become invalid once the caller moves on.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def setup_logging(service: str, level: str) -> logging.handlers.QueueListener:
+    """
+    Route all logging through a queue so the event loop never blocks on
+    stdout; a listener thread formats records as JSON and writes them.
+    The returned listener is started and stopped with the app lifespan;
+    records logged before it starts are kept in the queue.
+    """
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter(service))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_DeferredFormatQueueHandler(log_queue))
+    root.setLevel(level)
+
+    return logging.handlers.QueueListener(log_queue, stream_handler)
@@ -1,39 +1,71 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from contextlib import asynccontextmanager
 import logging
-import sys
-import time
-import uuid
 
-from app.database import connect_to_mongo, close_mongo_connection
+from app.database import connect_to_mongo, close_mongo_connection, ensure_indexes
 from app.routes import router
+from app.debug import router as debug_router
+from app.middleware import RequestContextMiddleware
+from app.admission import AdmissionControlMiddleware, AdmissionController, RouteGroup
+from app.compression import CompressionMiddleware
+from app.metrics import REGISTRY
+from app.tracing import tracer
+from app.health import readiness
+from app.slowquery import slow_queries
+from app.cache import start_caches, stop_caches
+from app.profiling import loop_monitor
+from app.revocation import revocation_list
 from app.config import settings
+from app.logging_config import setup_logging
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='{"time": "%(asctime)s", "level": "%(levelname)s", "message": "%(message)s", "service": "users"}',
-    handlers=[logging.StreamHandler(sys.stdout)]
-)
+log_listener = setup_logging("users", settings.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    log_listener.start()
+    tracer.start()
+    loop_monitor.start()
     logger.info("Starting users service")
     await connect_to_mongo()
+    await ensure_indexes()
+    await readiness.start()
+    slow_queries.start()
+    await revocation_list.start()
+    await start_caches()
     yield
     # Shutdown
     logger.info("Shutting down users service")
+    await stop_caches()
+    await revocation_list.stop()
+    await slow_queries.stop()
+    await readiness.stop()
     await close_mongo_connection()
+    await loop_monitor.stop()
+    tracer.shutdown()
+    log_listener.stop()
 
 app = FastAPI(
     title="Users Service",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+
+# Load shedding (innermost so rejections still carry CORS, correlation and metrics)
+admission = AdmissionController(
+    groups=[
+        # Password hashing is CPU bound; keep it from starving token-checked reads
+        RouteGroup("auth", priority=0, methods={"POST"}, path_pattern=r"^/api/v1/users/(login|register)$"),
+    ],
+    default_group=RouteGroup("default", priority=1)
 )
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware, controller=admission)
 
 # CORS middleware
 app.add_middleware(
@@ -44,31 +76,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Correlation ID middleware
-@app.middleware("http")
-async def add_correlation_id(request: Request, call_next):
-    correlation_id = request.headers.get("X-Correlation-ID") or str(uuid.uuid4())
-    request.state.correlation_id = correlation_id
-    
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    
-    response.headers["X-Correlation-ID"] = correlation_id
-    response.headers["X-Process-Time"] = str(process_time)
-    
-    logger.info(
-        f"Request completed",
-        extra={
-            "correlation_id": correlation_id,
-            "method": request.method,
-            "path": request.url.path,
-            "status_code": response.status_code,
-            "process_time": process_time
-        }
-    )
-    
-    return response
+# Response compression
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+# Correlation ID and timing middleware
+app.add_middleware(
+    RequestContextMiddleware,
+    sample_rate=settings.LOG_SAMPLE_RATE,
+    slow_request_ms=settings.LOG_SLOW_REQUEST_MS,
+    expose_db_stats=settings.ENVIRONMENT != "production"
+)
 
 # Exception handler
 @app.exception_handler(Exception)
@@ -94,19 +112,27 @@ async def health_check():
 
 @app.get("/ready")
 async def readiness_check():
-    from app.database import db
-    try:
-        await db.client.admin.command('ping')
-        return {"status": "ready", "service": "users"}
-    except Exception as e:
-        logger.error(f"Readiness check failed: {str(e)}")
+    if getattr(app.state, "draining", False):
+        return JSONResponse(
+            status_code=503,
+            content={"status": "not ready", "error": "draining"}
+        )
+    reasons = readiness.reasons()
+    if reasons:
         return JSONResponse(
             status_code=503,
-            content={"status": "not ready", "error": str(e)}
+            content={"status": "not ready", "error": "; ".join(reasons), "checks": readiness.checks()}
         )
+    return {"status": "ready", "service": "users", "checks": readiness.checks()}
+
+# Metrics
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 # Include API routes
 app.include_router(router, prefix="/api/v1")
+app.include_router(debug_router, include_in_schema=False)
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,22 +1,46 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from pydantic import AliasChoices, BaseModel, TypeAdapter, GetCoreSchemaHandler, GetJsonSchemaHandler, EmailStr, Field
+from typing import Annotated, Any, Optional, List
 from datetime import datetime
 from bson import ObjectId
+from pydantic.json_schema import JsonSchemaValue
+from pydantic_core import core_schema
 
-class PyObjectId(ObjectId):
-    @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
+def _parse_object_id(value: str) -> ObjectId:
+    if not ObjectId.is_valid(value):
+        raise ValueError("Invalid ObjectId")
+    return ObjectId(value)
+
+class _ObjectIdAnnotation:
+    """
+    Native pydantic-core schema for bson.ObjectId: ObjectId instances pass
+    through untouched, 24-char hex strings are parsed, and JSON output is
+    the hex string. `model_dump()` keeps the ObjectId so it can go straight
+    back into a Mongo query.
+    """
 
     @classmethod
-    def validate(cls, v):
-        if not ObjectId.is_valid(v):
-            raise ValueError("Invalid ObjectId")
-        return ObjectId(v)
+    def __get_pydantic_core_schema__(cls, source_type: Any, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        from_str = core_schema.chain_schema([
+            core_schema.str_schema(),
+            core_schema.no_info_plain_validator_function(_parse_object_id),
+        ])
+        return core_schema.json_or_python_schema(
+            json_schema=from_str,
+            python_schema=core_schema.union_schema([
+                core_schema.is_instance_schema(ObjectId),
+                from_str,
+            ]),
+            serialization=core_schema.plain_serializer_function_ser_schema(str, when_used="json"),
+        )
 
     @classmethod
-    def __get_pydantic_json_schema__(cls, field_schema):
-        field_schema.update(type="string")
+    def __get_pydantic_json_schema__(cls, schema: core_schema.CoreSchema, handler: GetJsonSchemaHandler) -> JsonSchemaValue:
+        return handler(core_schema.str_schema(pattern="^[0-9a-f]{24}$"))
+
+PyObjectId = Annotated[ObjectId, _ObjectIdAnnotation]
+
+# Response models read Mongo documents directly (`_id`) or keyword `id`
+DOCUMENT_ID = AliasChoices("_id", "id")
 
 class UserBase(BaseModel):
     email: EmailStr
@@ -31,7 +55,7 @@ class UserUpdate(BaseModel):
     phone: Optional[str] = None
 
 class UserInDB(UserBase):
-    id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    id: PyObjectId = Field(default_factory=ObjectId, alias="_id")
     hashed_password: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -39,20 +63,28 @@ class UserInDB(UserBase):
 
     class Config:
         populate_by_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
 
 class User(UserBase):
-    id: str
+    id: PyObjectId = Field(validation_alias=DOCUMENT_ID)
     created_at: datetime
     is_active: bool
 
     class Config:
         from_attributes = True
 
+class UserBatchRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1)
+
+class UserBatchResponse(BaseModel):
+    users: List[User]
+    missing: List[str] = []
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
 
 class TokenData(BaseModel):
     user_id: Optional[str] = None
+
+# Built once at import; used to serialize list responses straight from Mongo
+USER_BATCH_ADAPTER = TypeAdapter(UserBatchResponse)
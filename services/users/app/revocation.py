@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+from typing import Optional
+import asyncio
+import hashlib
+import logging
+import math
+
+from app.config import settings
+from app.database import get_database
+
+logger = logging.getLogger(__name__)
+
+# Re-read this far behind the newest revocation we have seen, so entries
+# written by replicas with a slightly slower clock are not skipped.
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str) -> None:
+        # Only count keys that set a new bit, so the overlap re-reads in
+        # RevocationList.refresh (and local revokes) are not counted twice
+        added = False
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not self._bits[pos >> 3] & mask:
+                self._bits[pos >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+class RevocationList:
+    """
+    Revoked token IDs (jti), stored in `revoked_tokens` until the token expires.
+
+    Each replica mirrors the collection into a Bloom filter, so checking a
+    token that was never revoked costs no database call. Only filter hits
+    (real revocations or false positives) are confirmed against MongoDB.
+    """
+
+    def __init__(self):
+        self._filter = self._new_filter(settings.REVOCATION_BLOOM_CAPACITY)
+        self._last_revoked_at: Optional[datetime] = None
+        self._refreshes = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _new_filter(capacity: int) -> BloomFilter:
+        return BloomFilter(capacity, settings.REVOCATION_BLOOM_ERROR_RATE)
+
+    async def revoke(self, jti: str, expires_at: datetime) -> None:
+        db = get_database()
+        now = datetime.utcnow()
+        await db.revoked_tokens.update_one(
+            {"_id": jti},
+            {"$setOnInsert": {"exp": expires_at, "revoked_at": now}},
+            upsert=True
+        )
+        # Visible on this replica immediately, on the others after a refresh
+        self._filter.add(jti)
+
+    async def is_revoked(self, jti: Optional[str]) -> bool:
+        if not jti or jti not in self._filter:
+            return False
+        db = get_database()
+        return await db.revoked_tokens.find_one({"_id": jti}, {"_id": 1}) is not None
+
+    async def rebuild(self) -> None:
+        db = get_database()
+        query = {"exp": {"$gt": datetime.utcnow()}}
+        count = await db.revoked_tokens.count_documents(query)
+        capacity = max(settings.REVOCATION_BLOOM_CAPACITY, count * 2)
+        bloom = self._new_filter(capacity)
+        last_revoked_at = None
+        async for doc in db.revoked_tokens.find(query, {"revoked_at": 1}):
+            bloom.add(doc["_id"])
+            if last_revoked_at is None or doc["revoked_at"] > last_revoked_at:
+                last_revoked_at = doc["revoked_at"]
+        self._filter = bloom
+        self._last_revoked_at = last_revoked_at
+        logger.info(f"Revocation filter rebuilt with {bloom.count} tokens")
+
+    async def refresh(self) -> None:
+        db = get_database()
+        query = {}
+        if self._last_revoked_at is not None:
+            query["revoked_at"] = {"$gte": self._last_revoked_at - REFRESH_OVERLAP}
+        async for doc in db.revoked_tokens.find(query, {"revoked_at": 1}):
+            self._filter.add(doc["_id"])
+            if self._last_revoked_at is None or doc["revoked_at"] > self._last_revoked_at:
+                self._last_revoked_at = doc["revoked_at"]
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.REVOCATION_REFRESH_SECONDS)
+            try:
+                self._refreshes += 1
+                # Bloom filters cannot forget, so periodically rebuild to
+                # drop expired tokens and resize if the list has grown
+                if (self._refreshes % settings.REVOCATION_REBUILD_EVERY == 0
+                        or self._filter.count > self._filter.capacity):
+                    await self.rebuild()
+                else:
+                    await self.refresh()
+            except Exception as e:
+                logger.error(f"Revocation filter refresh failed: {str(e)}")
+
+    async def start(self) -> None:
+        await self.rebuild()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+revocation_list = RevocationList()
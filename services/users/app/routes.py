@@ -1,9 +1,26 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime
 import logging
+import secrets
 
-from app.models import UserCreate, User, UserUpdate, Token
-from app.database import get_database
+from app.models import UserCreate, User, UserUpdate, Token, UserBatchRequest, UserBatchResponse, USER_BATCH_ADAPTER
+from app.database import get_database, EMAIL_COLLATION
+from app.config import settings
+from app.revocation import revocation_list
+from app.loader import DocumentLoader
+from app.cache import TwoTierCache, cache_backend
+from app.serialization import serialize
+from app.etag import (
+    ETAG_PROJECTION,
+    PRIVATE_CACHE_CONTROL,
+    compute_etag,
+    is_conditional,
+    etag_matches,
+    not_modified,
+    set_cache_headers
+)
 from app.auth import (
     get_password_hash,
     verify_password,
@@ -15,6 +32,17 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 security = HTTPBearer()
 
+# Concurrent profile reads are resolved with one $in query per window
+user_loader = DocumentLoader(
+    "users",
+    lambda: get_database().users,
+    projection={"hashed_password": 0}
+)
+
+# Profiles shared across replicas (without the password hash); profile
+# updates invalidate them
+profile_cache = TwoTierCache("user_profile", cache_backend)
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> dict:
@@ -25,20 +53,35 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials"
         )
+    if await revocation_list.is_revoked(payload.get("jti")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked"
+        )
     return payload
 
+async def verify_internal_caller(
+    x_internal_api_key: str = Header(...)
+) -> None:
+    if not secrets.compare_digest(x_internal_api_key, settings.INTERNAL_API_KEY):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid internal API key"
+        )
+
+# Fields safe to hand to other services; hashed_password is never loaded
+PUBLIC_USER_PROJECTION = {
+    "email": 1,
+    "name": 1,
+    "phone": 1,
+    "created_at": 1,
+    "is_active": 1
+}
+
 @router.post("/users/register", response_model=User, status_code=status.HTTP_201_CREATED)
 async def register_user(user: UserCreate):
     db = get_database()
     
-    # Check if user exists
-    existing_user = await db.users.find_one({"email": user.email})
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
     # Hash password
     hashed_password = get_password_hash(user.password)
     
@@ -46,30 +89,30 @@ async def register_user(user: UserCreate):
     user_dict = user.model_dump(exclude={"password"})
     user_dict["hashed_password"] = hashed_password
     
-    from datetime import datetime
-    user_dict["created_at"] = datetime.utcnow()
-    user_dict["updated_at"] = datetime.utcnow()
+    now = datetime.utcnow()
+    user_dict["created_at"] = now
+    user_dict["updated_at"] = now
     user_dict["is_active"] = True
     
-    result = await db.users.insert_one(user_dict)
-    created_user = await db.users.find_one({"_id": result.inserted_id})
+    # The unique email index rejects duplicates atomically, so no pre-check
+    try:
+        await db.users.insert_one(user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     
     logger.info(f"User registered: {user.email}")
     
-    return User(
-        id=str(created_user["_id"]),
-        email=created_user["email"],
-        name=created_user["name"],
-        phone=created_user.get("phone"),
-        created_at=created_user["created_at"],
-        is_active=created_user["is_active"]
-    )
+    # insert_one set `_id`; the response model drops hashed_password
+    return user_dict
 
 @router.post("/users/login", response_model=Token)
 async def login(email: str, password: str):
     db = get_database()
     
-    user = await db.users.find_one({"email": email})
+    user = await db.users.find_one({"email": email}, collation=EMAIL_COLLATION)
     if not user or not verify_password(password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -87,25 +130,43 @@ async def login(email: str, password: str):
     
     return Token(access_token=access_token)
 
+@router.post("/users/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(current_user: dict = Depends(get_current_user)):
+    jti = current_user.get("jti")
+    if jti:
+        expires_at = datetime.utcfromtimestamp(current_user["exp"])
+        await revocation_list.revoke(jti, expires_at)
+        logger.info(f"Token revoked for user {current_user['sub']}")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
 @router.get("/users/me", response_model=User)
-async def get_current_user_profile(current_user: dict = Depends(get_current_user)):
+async def get_current_user_profile(
+    request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
     db = get_database()
     user_id = current_user["sub"]
     
     from bson import ObjectId
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    
+    # Revalidate against the timestamps only, skipping the full document
+    if is_conditional(request):
+        stamp = await db.users.find_one({"_id": ObjectId(user_id)}, ETAG_PROJECTION)
+        if not stamp:
+            raise HTTPException(status_code=404, detail="User not found")
+        etag = compute_etag(stamp)
+        if etag_matches(request, etag):
+            return not_modified(etag, PRIVATE_CACHE_CONTROL)
+    
+    user = await profile_cache.get_or_load(user_id, lambda: user_loader.load(ObjectId(user_id)))
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return User(
-        id=str(user["_id"]),
-        email=user["email"],
-        name=user["name"],
-        phone=user.get("phone"),
-        created_at=user["created_at"],
-        is_active=user["is_active"]
-    )
+    set_cache_headers(response, compute_etag(user), PRIVATE_CACHE_CONTROL)
+    
+    return user
 
 @router.put("/users/me", response_model=User)
 async def update_user_profile(
@@ -116,7 +177,6 @@ async def update_user_profile(
     user_id = current_user["sub"]
     
     from bson import ObjectId
-    from datetime import datetime
     
     update_data = user_update.model_dump(exclude_unset=True)
     if update_data:
@@ -125,14 +185,50 @@ async def update_user_profile(
             {"_id": ObjectId(user_id)},
             {"$set": update_data}
         )
+        await profile_cache.invalidate(user_id)
     
     user = await db.users.find_one({"_id": ObjectId(user_id)})
     
-    return User(
-        id=str(user["_id"]),
-        email=user["email"],
-        name=user["name"],
-        phone=user.get("phone"),
-        created_at=user["created_at"],
-        is_active=user["is_active"]
-    )
\ No newline at end of file
+    return user
+
+@router.post(
+    "/users/batch-get",
+    response_model=UserBatchResponse,
+    dependencies=[Depends(verify_internal_caller)]
+)
+async def batch_get_users(request: UserBatchRequest):
+    """
+    Resolve many user IDs in one query (internal callers only).
+    Users are returned in request order; unknown IDs are listed in `missing`.
+    """
+    db = get_database()
+    
+    if len(request.ids) > settings.BATCH_GET_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BATCH_GET_MAX_IDS} IDs per request"
+        )
+    
+    from bson import ObjectId
+    
+    invalid = [user_id for user_id in request.ids if not ObjectId.is_valid(user_id)]
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid user IDs: {', '.join(invalid)}"
+        )
+    
+    object_ids = [ObjectId(user_id) for user_id in request.ids]
+    cursor = db.users.find({"_id": {"$in": list(set(object_ids))}}, PUBLIC_USER_PROJECTION)
+    found = {u["_id"]: u async for u in cursor}
+    
+    users = []
+    missing = []
+    for user_id, object_id in zip(request.ids, object_ids):
+        user = found.get(object_id)
+        if user is None:
+            missing.append(user_id)
+            continue
+        users.append(user)
+    
+    return serialize(USER_BATCH_ADAPTER, {"users": users, "missing": missing})
@@ -0,0 +1,17 @@
+from typing import Any
+
+from pydantic import TypeAdapter
+from starlette.responses import Response
+
+class PreSerializedJSONResponse(Response):
+    """A body that is already JSON bytes; rendered as-is."""
+    media_type = "application/json"
+
+def serialize(adapter: TypeAdapter, data: Any, **kwargs) -> PreSerializedJSONResponse:
+    """
+    Validate Mongo documents against a response type and encode them to
+    JSON in one pydantic-core pass. Returning a Response skips FastAPI's
+    own response_model validation and encoder, so pass the adapter built
+    from the route's response_model.
+    """
+    return PreSerializedJSONResponse(adapter.dump_json(adapter.validate_python(data)), **kwargs)
@@ -0,0 +1,324 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pymongo import monitoring
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+import uuid
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+class Span:
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "kind", "attributes",
+        "status", "start_unix_ns", "_start_perf_ns", "end_unix_ns"
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: int, attributes: Optional[dict]):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.status = STATUS_UNSET
+        self.start_unix_ns = time.time_ns()
+        self._start_perf_ns = time.perf_counter_ns()
+        self.end_unix_ns = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def end(self, duration_ns: Optional[int] = None) -> None:
+        if duration_ns is None:
+            duration_ns = time.perf_counter_ns() - self._start_perf_ns
+        self.end_unix_ns = self.start_unix_ns + duration_ns
+        tracer.processor.on_end(self)
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_unix_ns),
+            "endTimeUnixNano": str(self.end_unix_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def parse_traceparent(header: Optional[str]):
+    """Return (trace_id, parent_span_id) from a W3C traceparent header, or None."""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    trace_id, parent_id = parts[1].lower(), parts[2].lower()
+    try:
+        int(trace_id, 16)
+        int(parent_id, 16)
+    except ValueError:
+        return None
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id
+
+def trace_id_from_correlation_id(correlation_id: str) -> str:
+    # Correlation IDs are UUIDs, which are exactly the size of a trace ID, so
+    # a trace can be found by the correlation ID that appears in the logs
+    try:
+        return uuid.UUID(correlation_id).hex
+    except ValueError:
+        return os.urandom(16).hex()
+
+# Exporters
+
+class SpanExporter:
+    def export(self, spans: List[Span]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+def _otlp_payload(spans: List[Span]) -> dict:
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", settings.SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": "app.tracing"},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]
+    }
+
+class FileSpanExporter(SpanExporter):
+    """Appends one OTLP/JSON `resourceSpans` document per batch (JSON lines)."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "a") as f:
+            f.write(json.dumps(_otlp_payload(spans)) + "\n")
+
+class OTLPHttpSpanExporter(SpanExporter):
+    """Posts OTLP/JSON to a collector's /v1/traces endpoint."""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, spans: List[Span]) -> None:
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(_otlp_payload(spans)).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+class BatchSpanProcessor:
+    """Exports finished spans from a background thread, off the event loop."""
+
+    def __init__(self, exporter: SpanExporter, max_batch_size: int = 512, interval: float = 2.0):
+        self.exporter = exporter
+        self.max_batch_size = max_batch_size
+        self.interval = interval
+        self._queue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def on_end(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        if self._thread:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+        self.exporter.shutdown()
+
+    def _run(self) -> None:
+        while True:
+            stopping = self._stopping.wait(self.interval)
+            self._drain()
+            if stopping:
+                return
+
+    def _drain(self) -> None:
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.max_batch_size:
+                self._export(batch)
+                batch = []
+        if batch:
+            self._export(batch)
+
+    def _export(self, batch: List[Span]) -> None:
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            logger.error(f"Span export failed: {str(e)}")
+
+class Tracer:
+    def __init__(self, processor: Optional[BatchSpanProcessor]):
+        self.processor = processor
+
+    @property
+    def enabled(self) -> bool:
+        return self.processor is not None
+
+    def start_span(
+        self,
+        name: str,
+        kind: int = SPAN_KIND_INTERNAL,
+        parent: Optional[Span] = None,
+        attributes: Optional[dict] = None
+    ) -> Span:
+        parent = parent or current_span.get()
+        trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        return Span(name, trace_id, parent.span_id if parent else None, kind, attributes)
+
+    @contextmanager
+    def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, attributes: Optional[dict] = None):
+        """Run a block inside a child span of the current span."""
+        if not self.enabled:
+            yield None
+            return
+        span = self.start_span(name, kind, attributes=attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException:
+            span.status = STATUS_ERROR
+            raise
+        finally:
+            current_span.reset(token)
+            span.end()
+
+    def start(self) -> None:
+        if self.processor:
+            self.processor.start()
+
+    def shutdown(self) -> None:
+        if self.processor:
+            self.processor.shutdown()
+
+def _build_processor() -> Optional[BatchSpanProcessor]:
+    if settings.TRACING_EXPORTER == "file":
+        return BatchSpanProcessor(FileSpanExporter(settings.TRACING_FILE_PATH))
+    if settings.TRACING_EXPORTER == "otlp":
+        return BatchSpanProcessor(OTLPHttpSpanExporter(settings.TRACING_OTLP_ENDPOINT))
+    return None
+
+tracer = Tracer(_build_processor())
+
+# Propagation
+
+def outbound_headers() -> Dict[str, str]:
+    """Headers that carry the current trace and correlation ID to another service."""
+    from app.middleware import correlation_id_var
+
+    headers = {"X-Correlation-ID": correlation_id_var.get()}
+    span = current_span.get()
+    if span:
+        headers["traceparent"] = span.traceparent()
+    return headers
+
+async def traced_request(client, method: str, url: str, **kwargs):
+    """
+    Send a request with an httpx-style async client inside a client span,
+    propagating the trace context to the callee.
+    """
+    with tracer.span(
+        f"HTTP {method}",
+        kind=SPAN_KIND_CLIENT,
+        attributes={"http.method": method, "http.url": url}
+    ) as span:
+        headers = {**kwargs.pop("headers", {}), **outbound_headers()}
+        response = await client.request(method, url, headers=headers, **kwargs)
+        if span:
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.status = STATUS_ERROR
+        return response
+
+class MongoCommandTracing(monitoring.CommandListener):
+    """Records every MongoDB command as a client span of the current span."""
+
+    def __init__(self):
+        self._spans: Dict[int, Span] = {}
+
+    def started(self, event):
+        # Motor runs commands with a copy of the caller's context, so the
+        # request's span is visible here even on the executor thread
+        parent = current_span.get()
+        if parent is None or not tracer.enabled:
+            return
+        collection = event.command.get(event.command_name)
+        self._spans[event.request_id] = tracer.start_span(
+            f"mongodb.{event.command_name}",
+            kind=SPAN_KIND_CLIENT,
+            parent=parent,
+            attributes={
+                "db.system": "mongodb",
+                "db.name": event.database_name,
+                "db.operation": event.command_name,
+                "db.mongodb.collection": collection if isinstance(collection, str) else "",
+            }
+        )
+
+    def succeeded(self, event):
+        span = self._spans.pop(event.request_id, None)
+        if span:
+            span.end(event.duration_micros * 1000)
+
+    def failed(self, event):
+        span = self._spans.pop(event.request_id, None)
+        if span:
+            span.status = STATUS_ERROR
+            span.set_attribute("error.message", str(event.failure.get("errmsg", "")))
+            span.end(event.duration_micros * 1000)